@@ -0,0 +1,123 @@
+"""
+Per-stage benchmark of the processing pipeline against a local fake model.
+
+Each run builds a fresh `Capture` from a unique synthetic screenshot and pushes it
+through the same code the app uses: decode, hash, thumbnail, cache lookup,
+upload preprocessing, model construction, streaming generation and Markdown
+conversion. The response cache starts empty, so every run is a miss.
+Rendering into the Tk widget is not included.
+
+    python benchmarks/pipeline.py --runs 50
+    python benchmarks/pipeline.py --latency 0.8 --chunk-delay 0.02 --output-chars 8000 --workers 3
+    python benchmarks/pipeline.py --tail-rate 0.1 --tail-latency 8 --hedge-model fake:latency=0.3   # hedging
+    python benchmarks/pipeline.py --model models/gemini-2.5-flash --runs 5    # against the real API
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from PIL import Image, ImageDraw
+
+from gemini_vision.cache import ResponseCache
+from gemini_vision.capture import Capture
+from gemini_vision.instrumentation import STAGE_LABELS, format_ms, percentile
+from gemini_vision.jobs import DONE, Job, JobQueue
+from gemini_vision.pipeline import DEFAULT_PROMPT, read_saved_api_key
+from gemini_vision.policy import RequestPolicy
+from gemini_vision.preprocess import PreprocessOptions
+from gemini_vision.thumbnails import ThumbnailCache
+
+
+def synthetic_screenshot(width, height, number=0):
+    """A PNG of text lines, roughly like a document window. `number` makes each one unique."""
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((40, 10), f"Screenshot {number}", fill="black")
+    for y in range(40, height - 40, 24):
+        draw.text((40, y), f"Line {y // 24}: The quick brown fox jumps over the lazy dog. " * 4, fill="black")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run(args):
+    # Unique screenshots and an empty cache directory, so every run is a cache miss as in first use.
+    screenshots = [synthetic_screenshot(*args.image_size, number) for number in range(args.runs)]
+    cache_dir = tempfile.mkdtemp(prefix="gemini-vision-bench-")
+    preprocess = PreprocessOptions.from_spec(args.preprocess)
+    model = args.model or (f"fake:latency={args.latency},chunk_delay={args.chunk_delay},chars={args.output_chars},"
+                           f"fail_rate={args.fail_rate},tail_rate={args.tail_rate},tail_latency={args.tail_latency}")
+    api_key = os.environ.get("GEMINI_API_KEY") or read_saved_api_key()
+    try:
+        from markdown2 import Markdown
+    except ImportError:
+        Markdown = None
+
+    jobs = []
+    policy = None if args.no_policy else RequestPolicy(hedge_after=args.hedge_after, min_samples=5)
+    queue = JobQueue(args.workers, ResponseCache(cache_dir), policy=policy)
+    started = time.perf_counter()
+    for data in screenshots:
+        capture = Capture(data, source="synthetic")
+        with capture.timings.stage("thumbnail"): ThumbnailCache().get(capture, ThumbnailCache.size_for(550))
+        jobs.append(queue.submit(Job(capture, args.prompt, model, preprocess, api_key, hedge_model=args.hedge_model)))
+    for job in jobs: job.future.result()
+    notes = [job.request_notes for job in jobs if job.request_notes]
+    wall = time.perf_counter() - started
+    queue.shutdown()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    samples = {}
+    for job in jobs:
+        if job.status != DONE: raise SystemExit(f"Job #{job.id} {job.status}: {job.error}")
+        timings = job.all_timings()
+        if Markdown is not None:
+            with timings.stage("markdown"): Markdown().convert(job.markdown)
+        ms = timings.milliseconds()
+        ms["total"] = round(sum(v for k, v in ms.items() if k not in ("first_token", "queue_wait")), 1)
+        for name, value in ms.items(): samples.setdefault(name, []).append(value)
+    return samples, wall, len(screenshots[0]), notes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage latency of the capture-to-Markdown pipeline.")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="Jobs processed concurrently.")
+    parser.add_argument("--image-size", type=lambda s: tuple(map(int, s.split("x"))), default=(2880, 1800), help="WIDTHxHEIGHT of the synthetic screenshot.")
+    parser.add_argument("--preprocess", default="balanced")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("--model", help="Use this model instead of the fake one.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model: seconds to first chunk.")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="Fake model: seconds between chunks.")
+    parser.add_argument("--output-chars", type=int, default=4000, help="Fake model: approximate answer length.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fake model: fraction of requests failing with a transient error.")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Fake model: fraction of requests taking --tail-latency instead.")
+    parser.add_argument("--tail-latency", type=float, default=5.0, help="Fake model: seconds to first chunk for slow requests.")
+    parser.add_argument("--hedge-model", help="Model raced against requests slower than usual, e.g. 'fake:latency=0.3'.")
+    parser.add_argument("--hedge-after", type=float, default=2.0, help="Seconds before hedging until enough requests have been timed.")
+    parser.add_argument("--no-policy", action="store_true", help="Send requests without deadline, retries or hedging.")
+    parser.add_argument("--json", action="store_true", help="Print the raw per-stage samples as JSON.")
+    args = parser.parse_args(argv)
+
+    samples, wall, image_bytes, notes = run(args)
+    if args.json:
+        print(json.dumps(samples))
+        return 0
+    print(f"{args.runs} runs, {args.workers} worker(s), {args.image_size[0]}x{args.image_size[1]} PNG ({image_bytes / 1024:.0f} KB), preprocess={args.preprocess}")
+    print(f"{'stage':<12} {'p50':>9} {'p95':>9}")
+    for name in [n for n in STAGE_LABELS if n in samples] + ["total"]:
+        print(f"{STAGE_LABELS.get(name, name):<12} {format_ms(percentile(samples[name], 0.5)):>9} {format_ms(percentile(samples[name], 0.95)):>9}")
+    print(f"wall clock {format_ms(wall * 1000)}, {args.runs / wall:.2f} jobs/s")
+    if notes: print(f"{len(notes)} job(s) retried or hedged: " + "; ".join(sorted(set(notes))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Startup benchmark for the `gemini-vision` entry point.
+
+Measures
+  * the import time of `gemini_vision.__main__` (from `python -X importtime`),
+    and checks that no heavy module is imported eagerly;
+  * the wall-clock time from process launch until the floating button is
+    visible ("first window") and until the hidden main window is built.
+
+Runs under the current $DISPLAY, or starts a private Xvfb server if there is
+none. The app runs with a throwaway $HOME so the user's cache is not touched.
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --max-import-ms 60 --max-first-window-ms 400   # fail on regressions
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that must not be loaded before the floater is on screen.
+HEAVY_MODULES = ("google.generativeai", "markdown2", "tkhtmlview", "PIL.ImageTk", "PIL.Image")
+
+
+def child_env(home):
+    env = dict(os.environ, HOME=home, PYTHONPATH=os.pathsep.join(filter(None, [os.path.join(ROOT, "src"), os.environ.get("PYTHONPATH")])))
+    env.pop("GEMINI_API_KEY", None)
+    return env
+
+
+def measure_import(env):
+    """Returns (cumulative import time of gemini_vision.__main__ in ms, heavy modules it pulled in)."""
+    code = f"import sys, gemini_vision.__main__; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True)
+    micros = next(int(line.split("|")[1]) for line in result.stderr.splitlines() if line.rstrip().endswith("| gemini_vision.__main__"))
+    return micros / 1000, [m for m in result.stdout.strip().split(",") if m]
+
+
+def measure_window(env, timeout=30):
+    """Launches the app with the startup probe and returns ms to each milestone."""
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gemini_vision"], env=dict(env, GEMINI_VISION_STARTUP_PROBE="1"), stdout=subprocess.PIPE, text=True)
+    milestones = {}
+    try:
+        for line in proc.stdout:
+            milestones[line.strip()] = (time.perf_counter() - started) * 1000
+            if "main-window" in milestones: break
+        proc.wait(timeout=timeout)
+    finally:
+        if proc.poll() is None: proc.kill()
+    if "first-window" not in milestones:
+        raise RuntimeError(f"The app exited with status {proc.returncode} before showing a window.")
+    return milestones
+
+
+def start_xvfb():
+    """Starts Xvfb on a free display number and returns (process, display)."""
+    if not shutil.which("Xvfb"):
+        sys.exit("No $DISPLAY and Xvfb is not installed.")
+    for number in range(90, 110):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"): continue
+        proc = subprocess.Popen(["Xvfb", f":{number}", "-nolisten", "tcp", "-screen", "0", "1920x1080x24"], stderr=subprocess.DEVNULL)
+        for _ in range(100):
+            if os.path.exists(f"/tmp/.X11-unix/X{number}"): return proc, f":{number}"
+            if proc.poll() is not None: break
+            time.sleep(0.05)
+        proc.kill()
+    sys.exit("Could not start Xvfb.")
+
+
+def describe(name, samples):
+    samples = sorted(samples)
+    return f"{name:<14} median {statistics.median(samples):7.1f} ms   min {samples[0]:7.1f} ms   max {samples[-1]:7.1f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time exceeds this.")
+    parser.add_argument("--max-first-window-ms", type=float, help="Fail if the median time to first window exceeds this.")
+    args = parser.parse_args(argv)
+
+    xvfb = None
+    home = tempfile.mkdtemp(prefix="gemini-vision-bench-")
+    try:
+        # Pre-grant the one-time permission dialog so it does not block startup.
+        os.makedirs(os.path.join(home, ".cache", "gemini_vision_app"))
+        open(os.path.join(home, ".cache", "gemini_vision_app", ".permission.granted"), "w").close()
+        env = child_env(home)
+        if not env.get("DISPLAY"):
+            xvfb, env["DISPLAY"] = start_xvfb()
+
+        imports, eager, first, ready = [], set(), [], []
+        for _ in range(args.runs):
+            ms, heavy = measure_import(env)
+            imports.append(ms)
+            eager.update(heavy)
+            milestones = measure_window(env)
+            first.append(milestones["first-window"])
+            ready.append(milestones.get("main-window", float("nan")))
+
+        print(describe("import", imports))
+        print(describe("first window", first))
+        print(describe("main window", ready))
+        failures = []
+        if eager: failures.append(f"heavy modules imported at startup: {', '.join(sorted(eager))}")
+        if args.max_import_ms and statistics.median(imports) > args.max_import_ms:
+            failures.append(f"import time above {args.max_import_ms} ms")
+        if args.max_first_window_ms and statistics.median(first) > args.max_first_window_ms:
+            failures.append(f"time to first window above {args.max_first_window_ms} ms")
+        for failure in failures: print(f"FAIL: {failure}")
+        return 1 if failures else 0
+    finally:
+        if xvfb: xvfb.kill()
+        shutil.rmtree(home, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,24 @@ from .app import AppController
 
 import os
 
+def _install_startup_probe(root, app):
+    """
+    Reports startup milestones on stdout and exits once the app is ready.
+    Enabled by GEMINI_VISION_STARTUP_PROBE=1; see benchmarks/startup.py.
+    """
+    def on_mapped(event=None):
+        if event is not None and event.widget is not app.floater.floater: return
+        print("first-window", flush=True)
+        app.floater.floater.unbind("<Map>")
+        wait_for_main_window()
+    def wait_for_main_window():
+        if app.gui is None:
+            root.after(5, wait_for_main_window)
+            return
+        print("main-window", flush=True)
+        root.after(0, root.destroy)
+    app.floater.floater.bind("<Map>", on_mapped)
+
 def main():
     """The main entry point for the application."""
     if os.name != "posix":
@@ -11,7 +29,9 @@ def main():
          
     root = tk.Tk()
     app = AppController(root)
+    if os.environ.get("GEMINI_VISION_STARTUP_PROBE"):
+        _install_startup_probe(root, app)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
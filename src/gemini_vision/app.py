@@ -2,14 +2,39 @@ import tkinter as tk
 from tkinter import scrolledtext, filedialog, messagebox
 from tkinter import ttk
 import subprocess
+import io
 import os
 import threading
-import google.generativeai as genai
-from PIL import Image, ImageTk
-import re
 import time
-from markdown2 import Markdown
-from tkhtmlview import HTMLText
+from .cache import ResponseCache
+from .capture import get_backend
+from .client import daemon_or_local
+from .delta import DeltaTracker
+from .history import PAGE_SIZE, THUMBNAIL_SIZE, History
+from .instrumentation import TimingLog, Timings
+from .jobs import DONE, FAILED, Job, JobQueue
+from .models import ModelCatalogue, fetch_vision_models, pick_hedge_model
+from .pipeline import CACHE_DIR, DEFAULT_MODEL, DEFAULT_PROMPT, ModelPool
+from .policy import RequestPolicy
+# PIL, markdown2, tkhtmlview and the Gemini SDK are imported where they are
+# used, so that the floating button can appear before they are loaded.
+
+# Minimum time between re-renders of a streaming result, so a fast stream
+# cannot flood the Tk event loop with set_html calls.
+RENDER_INTERVAL_MS = 150
+
+def prewarm_imports():
+    """Loads the SDK and rendering stacks, normally on a background thread after the floater is shown."""
+    try:
+        import google.generativeai, markdown2, tkhtmlview, PIL.ImageTk # noqa: F401
+        from . import preprocess # noqa: F401
+    except Exception: pass # Any real problem resurfaces where the module is used
+
+# How often the controller checks whether the prewarm thread has finished.
+PREWARM_POLL_MS = 50
+
+# Number of jobs processed at the same time.
+MAX_CONCURRENT_JOBS = 3
 
 # --- Main Application GUI Class ---
 class GeminiVisionApp:
@@ -41,15 +66,43 @@ class GeminiVisionApp:
         # --- Member Variables ---
         self.api_key_var = tk.StringVar()
         self.model_var = tk.StringVar()
+        self.preprocess_var = tk.StringVar(value="original")
+        self.auto_process_var = tk.BooleanVar(value=True)
+        self.tiling_var = tk.BooleanVar(value=True)
+        self.delta_var = tk.BooleanVar(value=True)
+        self.hedge_var = tk.BooleanVar(value=False)
+        self.available_models = [] # The sorted list shown in the model menu
         self.last_loaded_api_key = None
-        self.temp_screenshot_path = "temp_screenshot.png"
+        self.capture_backend = get_backend()
+        self.capture = None # The current screenshot, shared by preview, cache key and upload
         self.thumbnail_image = None # To prevent garbage collection
+        self.thumbnail_cache = None # Created with the first preview, since it needs PIL
+        self._thumbnail_generation = 0 # Lets stale worker results be dropped
+        self._thumbnail_size = None
+        self._resize_job = None
         self.raw_markdown_result = "" # To store the original markdown for copy/save
+        self.selected_job = None # The job whose result is shown
+        self._dropped_rows = 0 # Job list rows removed after the queue dropped their jobs
+        self._render_lock = threading.Lock()
+        self._pending_render = None # (markdown, status, job) waiting for the next coalesced render
+        self._render_scheduled = False
+        self._last_render_time = 0.0
 
         # --- API Key Storage Path ---
-        self.cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "gemini_vision_app")
+        self.cache_dir = CACHE_DIR
         self.api_key_file = os.path.join(self.cache_dir, "api_key.txt")
         self.permission_flag_file = os.path.join(self.cache_dir, ".permission.granted")
+        self.history = History(os.path.join(self.cache_dir, "history.sqlite3"))
+        self.history_window = None
+        # Results evicted from the response cache are still found in the history.
+        self.response_cache = ResponseCache(os.path.join(self.cache_dir, "responses"), fallback=self.history.markdown_for_key)
+        self.model_catalogue = ModelCatalogue(os.path.join(self.cache_dir, "models.json"))
+        self.timing_log = TimingLog(os.path.join(self.cache_dir, "timings.jsonl"))
+        self.delta_tracker = DeltaTracker()
+        self.request_policy = RequestPolicy()
+        # Requests go through gemini-vision-daemon while one is running, otherwise through models kept warm here.
+        self.job_queue = JobQueue(MAX_CONCURRENT_JOBS, self.response_cache, on_update=self._on_job_update, on_progress=self._on_job_progress,
+                                  delta=self.delta_tracker, policy=self.request_policy, models=daemon_or_local(ModelPool()))
 
         # --- UI Setup ---
         self.create_widgets()
@@ -61,6 +114,8 @@ class GeminiVisionApp:
         self.root.after(100, self.check_and_show_permission_dialog_once)
 
     def create_widgets(self):
+        from tkhtmlview import HTMLText
+        from .preprocess import PRESETS
         style_args = {'bg': self.colors["frame_bg"], 'fg': self.colors["label_fg"], 'font': ('Helvetica Neue', 14)}
         button_style = {'bg': self.colors["button_bg"], 'fg': self.colors["button_fg"], 'font': ('Helvetica Neue', 13, 'bold'), 'relief': 'flat', 'padx': 10, 'pady': 8, 'borderwidth': 0}
         entry_style = {'bg': self.colors["entry_bg"], 'fg': self.colors["entry_fg"], 'insertbackground': self.colors["entry_fg"], 'relief': 'solid', 'borderwidth': 1, 'highlightthickness': 1, 'highlightcolor': self.colors["button_bg"], 'highlightbackground': '#cccccc', 'font': ('Helvetica Neue', 14)}
@@ -87,11 +142,18 @@ class GeminiVisionApp:
         self.model_menu.pack(side='left', padx=(60, 0), fill='x', expand=True)
         self.model_menu.config(state=tk.DISABLED)
 
+        upload_frame = tk.Frame(top_controls_frame, bg=style_args['bg'])
+        upload_frame.pack(fill='x', expand=True, pady=(0, 10))
+        tk.Label(upload_frame, text="Upload:", **style_args).pack(side='left', anchor='w')
+        self.preprocess_menu = ttk.OptionMenu(upload_frame, self.preprocess_var, self.preprocess_var.get(), *PRESETS)
+        self.preprocess_menu.pack(side='left', padx=(55, 0), fill='x', expand=True)
+
         paned_window = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
         paned_window.pack(fill='both', expand=True, padx=20, pady=10)
 
         self.left_pane = ttk.Frame(paned_window, padding=10)
         paned_window.add(self.left_pane, weight=1)
+        self.left_pane.bind("<Configure>", self.on_left_pane_resize)
 
         tk.Label(self.left_pane, text="1. Capture & Prompt", **style_args).pack(anchor='w', pady=(0, 5))
         self.capture_button = tk.Button(self.left_pane, text="Capture Window", **button_style, command=self.run_capture_workflow)
@@ -105,6 +167,10 @@ class GeminiVisionApp:
         self.prompt_entry = tk.Entry(self.left_pane, width=70, **entry_style)
         self.prompt_entry.pack(fill='x', pady=(0, 10))
         self.prompt_entry.insert(0, "Transcribe this into a Markdown document.")
+        tk.Checkbutton(self.left_pane, text="Process each capture automatically", variable=self.auto_process_var, bg=style_args['bg'], fg=style_args['fg']).pack(anchor='w')
+        tk.Checkbutton(self.left_pane, text="Split tall captures into tiles processed in parallel", variable=self.tiling_var, bg=style_args['bg'], fg=style_args['fg']).pack(anchor='w')
+        tk.Checkbutton(self.left_pane, text="Reuse the previous result when only part of the screen changed", variable=self.delta_var, bg=style_args['bg'], fg=style_args['fg']).pack(anchor='w')
+        tk.Checkbutton(self.left_pane, text="Race slow requests against a faster model", variable=self.hedge_var, bg=style_args['bg'], fg=style_args['fg']).pack(anchor='w', pady=(0, 10))
 
         self.process_button = tk.Button(self.left_pane, text="Process with Gemini", **button_style, command=self.run_processing_workflow)
         self.process_button.pack(fill='x')
@@ -114,6 +180,13 @@ class GeminiVisionApp:
         paned_window.add(right_pane, weight=1)
 
         tk.Label(right_pane, text="2. Review Result", **style_args).pack(anchor='w', pady=(0, 5))
+        jobs_frame = tk.Frame(right_pane)
+        jobs_frame.pack(fill='x', pady=(0, 10))
+        self.job_list = tk.Listbox(jobs_frame, height=5, activestyle='none', exportselection=False, font=('Menlo', 11))
+        self.job_list.pack(side='left', fill='x', expand=True)
+        self.job_list.bind("<<ListboxSelect>>", self.on_job_select)
+        self.cancel_button = tk.Button(jobs_frame, text="Cancel", **button_style, command=self.cancel_selected_job)
+        self.cancel_button.pack(side='right', fill='y', padx=(5, 0))
         self.result_text = HTMLText(right_pane, background=self.colors['text_bg'])
         self.result_text.pack(fill='both', expand=True, pady=(0, 10))
         self.result_text.set_html("<p>Results will appear here...</p>")
@@ -124,6 +197,8 @@ class GeminiVisionApp:
         self.copy_button.pack(side='left', expand=True, padx=(0, 5))
         self.save_button = tk.Button(action_frame, text="Save as .md", **button_style, command=self.save_as_markdown)
         self.save_button.pack(side='right', expand=True, padx=(5, 0))
+        self.history_button = tk.Button(action_frame, text="History", **button_style, command=self.show_history)
+        self.history_button.pack(side='right', expand=True, padx=5)
 
         self.status_var = tk.StringVar()
         self.status_var.set("Ready. Enter API Key to begin.")
@@ -157,33 +232,39 @@ class GeminiVisionApp:
     def fetch_and_update_models(self):
         api_key = self.api_key_var.get().strip()
         if not api_key or api_key == self.last_loaded_api_key: return
-        self.status_var.set("Fetching available models...")
-        self.capture_button.config(state=tk.DISABLED, bg=self.colors["button_disabled_bg"])
-        self.model_menu.config(state=tk.DISABLED)
-        threading.Thread(target=self._fetch_models_thread, args=(api_key,)).start()
-    def _fetch_models_thread(self, api_key):
+        # Show the cached list straight away and refresh it in the background.
+        cached_models = self.model_catalogue.load(api_key)
+        if cached_models:
+            self._update_model_menu(cached_models, api_key, "Models loaded. Ready to capture (refreshing model list...).")
+        else:
+            self.status_var.set("Fetching available models...")
+            self.capture_button.config(state=tk.DISABLED, bg=self.colors["button_disabled_bg"])
+            self.model_menu.config(state=tk.DISABLED)
+        threading.Thread(target=self._fetch_models_thread, args=(api_key, cached_models), daemon=True).start()
+    def _fetch_models_thread(self, api_key, cached_models=None):
         try:
-            genai.configure(api_key=api_key)
-            vision_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods and ('vision' in m.name or 'flash' in m.name)]
-            if not vision_models: raise Exception("No compatible vision models found.")
-            def get_sort_key(name):
-                latest = 1 if 'latest' in name else 0
-                version = float(match.group(1)) if (match := re.search(r'(\d+\.\d+)', name)) else 0.0
-                return (-latest, -version, name)
-            sorted_models = sorted(vision_models, key=get_sort_key)
-            self.root.after(0, self._update_model_menu, sorted_models, api_key)
-        except Exception as e: self.root.after(0, messagebox.showerror, "API Error", f"Failed to fetch models: {e}")
-    def _update_model_menu(self, models, api_key):
+            sorted_models = fetch_vision_models(api_key)
+            self.model_catalogue.save(api_key, sorted_models)
+            if sorted_models != cached_models:
+                self.root.after(0, self._update_model_menu, sorted_models, api_key)
+            else:
+                self.root.after(0, lambda: self.status_var.set("Model list is up to date. Ready to capture."))
+        except Exception as e:
+            if cached_models: self.root.after(0, self.status_var.set, f"Using cached model list; refresh failed: {e}")
+            else: self.root.after(0, messagebox.showerror, "API Error", f"Failed to fetch models: {e}")
+    def _update_model_menu(self, models, api_key, status="Models loaded. Ready to capture."):
+        if api_key != self.api_key_var.get().strip(): return # The key changed while fetching
         self.last_loaded_api_key = api_key
+        self.available_models = models
         menu = self.model_menu["menu"]
         menu.delete(0, "end")
         for name in models:
             menu.add_command(label=name, command=lambda v=name: self.model_var.set(v))
-        default = 'models/gemini-2.5-flash'
-        self.model_var.set(default if default in models else models[0])
+        if self.model_var.get() not in models:
+            self.model_var.set(DEFAULT_MODEL if DEFAULT_MODEL in models else models[0])
         self.model_menu.config(state=tk.NORMAL)
         self.capture_button.config(state=tk.NORMAL, bg=self.colors["button_bg"])
-        self.status_var.set("Models loaded. Ready to capture.")
+        self.status_var.set(status)
         self.save_api_key(api_key)
     def check_and_show_permission_dialog_once(self):
         try:
@@ -212,71 +293,172 @@ class GeminiVisionApp:
         self.root.wait_window(dialog)
     def run_capture_workflow(self):
         self.capture_button.config(state=tk.DISABLED)
-        self.process_button.config(state=tk.DISABLED, bg=self.colors["button_disabled_bg"])
         threading.Thread(target=self._capture_thread).start()
     def _capture_thread(self):
         self.root.after(0, lambda: self.status_var.set("Taking screenshot... Please select a window."))
         self.root.after(0, self.root.withdraw)
         try:
             time.sleep(0.1) # Ensure the window is hidden
-            subprocess.run(["screencapture", "-i", self.temp_screenshot_path], check=True)
+            started = time.perf_counter()
+            capture = self.capture_backend.capture()
+            if capture is not None: capture.timings.add("screencapture", time.perf_counter() - started)
             self.root.after(0, self.root.deiconify)
-            if not os.path.exists(self.temp_screenshot_path):
+            if capture is None:
                 self.root.after(0, lambda: self.status_var.set("Screenshot cancelled. Ready."))
                 self.root.after(0, lambda: self.capture_button.config(state=tk.NORMAL))
                 return
-            self.root.after(0, self._display_thumbnail)
-        except subprocess.CalledProcessError:
+            self.root.after(0, self._set_capture, capture)
+        except (OSError, subprocess.CalledProcessError):
             self.root.after(0, lambda: self.status_var.set("Screenshot failed or was cancelled."))
             self.root.after(0, self.root.deiconify)
             self.root.after(0, lambda: self.capture_button.config(state=tk.NORMAL))
-    def _display_thumbnail(self):
+    def _set_capture(self, capture):
+        if self.capture is not None: self.capture.release()
+        self.capture = capture
+        self.capture_button.config(state=tk.NORMAL)
+        self._display_thumbnail()
+        if self.auto_process_var.get(): self.run_processing_workflow()
+    def _display_thumbnail(self, announce=True):
+        """Starts building the preview on a worker thread; only the PhotoImage is made on the main thread."""
+        if self.thumbnail_cache is None:
+            from .thumbnails import ThumbnailCache
+            self.thumbnail_cache = ThumbnailCache()
+        self._thumbnail_generation += 1
+        self._thumbnail_size = self.thumbnail_cache.size_for(self.left_pane.winfo_width())
+        threading.Thread(target=self._thumbnail_thread, args=(self.capture, self._thumbnail_generation, self._thumbnail_size, announce), daemon=True).start()
+    def _thumbnail_thread(self, capture, generation, size, announce):
         try:
-            img = Image.open(self.temp_screenshot_path)
-            max_width = self.left_pane.winfo_width()
-            if max_width <= 1: max_width = 550
-            max_height = 450
-            img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            self.thumbnail_image = ImageTk.PhotoImage(img)
-            self.thumbnail_label.config(image=self.thumbnail_image)
+            if announce:
+                with capture.timings.stage("thumbnail"): thumbnail = self.thumbnail_cache.get(capture, size)
+            else:
+                thumbnail = self.thumbnail_cache.get(capture, size)
+            self.root.after(0, self._show_thumbnail, generation, thumbnail, announce)
+        except Exception as e: self.root.after(0, messagebox.showerror, "Thumbnail Error", f"Could not display screenshot preview: {e}")
+    def _show_thumbnail(self, generation, thumbnail, announce):
+        if generation != self._thumbnail_generation: return # Superseded by a newer capture or pane size
+        from PIL import ImageTk
+        self.thumbnail_image = ImageTk.PhotoImage(thumbnail)
+        self.thumbnail_label.config(image=self.thumbnail_image)
+        if announce:
             self.status_var.set("Screenshot captured. Ready to process.")
-            self.capture_button.config(state=tk.NORMAL)
             self.process_button.config(state=tk.NORMAL, bg=self.colors["button_bg"])
-        except Exception as e: messagebox.showerror("Thumbnail Error", f"Could not display screenshot preview: {e}")
+    def on_left_pane_resize(self, event=None):
+        # Debounced: re-render once the user stops dragging, and only if the size bucket changed.
+        if self._resize_job: self.root.after_cancel(self._resize_job)
+        self._resize_job = self.root.after(200, self._refresh_thumbnail_after_resize)
+    def _refresh_thumbnail_after_resize(self):
+        self._resize_job = None
+        if self.thumbnail_image is None: return
+        if self.thumbnail_cache.size_for(self.left_pane.winfo_width()) != self._thumbnail_size:
+            self._display_thumbnail(announce=False)
     def run_processing_workflow(self):
-        if not os.path.exists(self.temp_screenshot_path):
+        if self.capture is None:
             messagebox.showwarning("Warning", "No screenshot has been captured yet.")
             return
-        self.capture_button.config(state=tk.DISABLED)
-        self.process_button.config(state=tk.DISABLED, text="Processing...")
-        threading.Thread(target=self._processing_thread).start()
-    def _processing_thread(self):
+        from .preprocess import PRESETS
+        model = self.model_var.get()
+        hedge_model = pick_hedge_model(self.available_models, model) if self.hedge_var.get() else None
+        job = Job(self.capture, self.prompt_entry.get().strip() or DEFAULT_PROMPT, model, PRESETS[self.preprocess_var.get()], self.api_key_var.get(),
+                  tiling=self.tiling_var.get(), use_delta=self.delta_var.get(), hedge_model=hedge_model)
+        self.selected_job = job
+        self.job_queue.submit(job)
+    # --- Job List ---
+    def _on_job_update(self, job):
+        """Called from worker threads when a job changes status."""
+        if job.finished:
+            if job.status == DONE: self._record_history(job)
+            self.root.after(0, self._finish_job, job)
+            return
+        self.root.after(0, self._refresh_job_row, job)
+        if job is self.selected_job: self._schedule_render(job.markdown, job.summary(), job)
+    def _on_job_progress(self, job):
+        if job is self.selected_job: self._schedule_render(job.markdown, job.summary(), job)
+    def _drop_old_rows(self):
+        """Removes the rows of jobs the queue no longer lists, which are always the oldest."""
+        stale = self.job_queue.dropped - self._dropped_rows
+        if stale > 0: self.job_list.delete(0, stale - 1)
+        self._dropped_rows = self.job_queue.dropped
+    def _refresh_job_row(self, job):
+        self._drop_old_rows()
+        if job not in self.job_queue.jobs: return
+        index = self.job_queue.jobs.index(job)
+        if index < self.job_list.size(): self.job_list.delete(index)
+        self.job_list.insert(index, job.label())
+        if job is self.selected_job:
+            self.job_list.selection_clear(0, "end")
+            self.job_list.selection_set(index)
+            self.job_list.see(index)
+            if job.status == FAILED: messagebox.showerror("Error", str(job.error))
+    def _finish_job(self, job):
+        """Shows a finished job's final result right away, then logs its stage timings."""
+        self._refresh_job_row(job)
+        if job is self.selected_job:
+            with self._render_lock:
+                if self._pending_render and self._pending_render[2] is job: self._pending_render = None
+            self._render(job.markdown, None, job.timings)
+        self.timing_log.append(job.timing_record())
+        if job is self.selected_job:
+            savings = f" · {self.delta_tracker.summary()}" if self.delta_tracker.requests_avoided or self.delta_tracker.bytes_avoided else ""
+            self.status_var.set(job.summary() + savings)
+    def _record_history(self, job):
+        """Stores a finished job's result. Runs on the job's worker thread."""
+        if job.cached and (self.history.markdown_for_key(job.cache_key) or (None,))[0] == job.markdown: return # Already there
         try:
-            api_key = self.api_key_var.get()
-            user_prompt = self.prompt_entry.get().strip() or "Transcribe this screenshot into a Markdown document."
-            selected_model = self.model_var.get()
-            self.root.after(0, lambda: self.status_var.set(f"Calling {os.path.basename(selected_model)}..."))
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(selected_model)
-            img = Image.open(self.temp_screenshot_path)
-            response = model.generate_content([user_prompt, img])
-            self.raw_markdown_result = response.text
-            markdown_converter = Markdown()
-            html_content = markdown_converter.convert(self.raw_markdown_result)
-            def update_ui_with_result():
-                self.result_text.set_html(html_content)
-                self.status_var.set("Success! Displaying result.")
-            self.root.after(0, update_ui_with_result)
-        except Exception as e:
-            def show_error():
-                self.status_var.set("An error occurred.")
-                messagebox.showerror("Error", str(e))
-            self.root.after(0, show_error)
-        finally:
-            self.root.after(0, self.reset_buttons_after_processing)
-    def reset_buttons_after_processing(self):
-        self.capture_button.config(state=tk.NORMAL)
-        self.process_button.config(state=tk.NORMAL, text="Process with Gemini")
+            self.history.add(job.markdown, job.prompt, job.model_name, image=job.capture.image, source=job.capture.source,
+                             cache_key=job.cache_key, captured_at=job.capture.created_at, seconds=job.finished_at - job.started_at)
+        except Exception: return # sqlite3 or thumbnail errors must not lose the result on screen
+        if self.history_window is not None: self.root.after(0, self.history_window.refresh)
+    def on_job_select(self, event=None):
+        self._drop_old_rows()
+        selection = self.job_list.curselection()
+        if not selection: return
+        job = self.job_queue.jobs[selection[0]]
+        self.selected_job = job
+        self._schedule_render(job.markdown, job.summary(), job)
+    def cancel_selected_job(self):
+        if self.selected_job is not None: self.job_queue.cancel(self.selected_job)
+    def _schedule_render(self, markdown, status, job=None):
+        """
+        Queues `markdown` for display. Called from worker threads; renders are
+        coalesced so only the latest text is drawn, at most once per RENDER_INTERVAL_MS.
+        Text from `job` is dropped if another job has been selected meanwhile.
+        """
+        with self._render_lock:
+            self._pending_render = (markdown, status, job)
+            if self._render_scheduled: return
+            self._render_scheduled = True
+            delay = max(0, int(RENDER_INTERVAL_MS - 1000 * (time.monotonic() - self._last_render_time)))
+        self.root.after(delay, self._flush_render)
+    def _flush_render(self):
+        with self._render_lock:
+            pending, self._pending_render = self._pending_render, None
+            self._render_scheduled = False
+        if pending is None: return # Superseded by a final render
+        markdown, status, job = pending
+        if job is not None and job is not self.selected_job: return
+        self._render(markdown, status)
+    def _render(self, markdown, status, timings=None):
+        """Converts and displays `markdown`; with `timings`, the two steps are recorded as stages."""
+        from markdown2 import Markdown
+        timings = timings or Timings()
+        self._last_render_time = time.monotonic()
+        self.raw_markdown_result = markdown
+        with timings.stage("markdown"): html = Markdown().convert(markdown) if markdown else "<p>Results will appear here...</p>"
+        with timings.stage("set_html"): self.result_text.set_html(html)
+        if status is not None: self.status_var.set(status)
+    # --- History ---
+    def show_history(self):
+        if self.history_window is None: self.history_window = HistoryWindow(self)
+        else: self.history_window.window.deiconify(); self.history_window.window.lift()
+    def open_history_entry(self, entry_id):
+        """Shows a past result from the history database; never calls the API."""
+        entry = self.history.get(entry_id)
+        if entry is None: return
+        self.selected_job = None
+        self.job_list.selection_clear(0, "end")
+        if entry["cache_key"]: self.response_cache.put(entry["cache_key"], entry["markdown"], model=entry["model"], prompt=entry["prompt"])
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["finished_at"]))
+        self._render(entry["markdown"], f"From history: {entry['model'].split('/')[-1]}, {when}.")
     def copy_to_clipboard(self):
         if self.raw_markdown_result:
             self.root.clipboard_clear()
@@ -293,6 +475,110 @@ class GeminiVisionApp:
                 self.status_var.set(f"File saved to {os.path.basename(file_path)}")
             except Exception as e: messagebox.showerror("Save Error", f"Could not save file:\n{e}")
 
+# --- History Window ---
+class HistoryWindow:
+    """
+    Searchable list of past results, one page at a time. Pages and their
+    thumbnails are fetched on a worker thread, so typing stays responsive.
+    """
+    SEARCH_DELAY_MS = 250
+
+    def __init__(self, app):
+        self.app = app
+        self.offset = 0
+        self.total = 0
+        self.images = [] # PhotoImages of the current page, to prevent garbage collection
+        self._generation = 0 # Lets results of superseded queries be dropped
+        self._search_job = None
+        self.window = tk.Toplevel(app.root)
+        self.window.title("History")
+        self.window.geometry("760x560")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.search_var = tk.StringVar()
+        search_frame = tk.Frame(self.window)
+        search_frame.pack(fill='x', padx=10, pady=10)
+        tk.Label(search_frame, text="Search:").pack(side='left')
+        search_entry = tk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(side='left', fill='x', expand=True, padx=(5, 0))
+        search_entry.focus_set()
+        self.search_var.trace_add("write", self._on_search_change)
+
+        ttk.Style().configure("History.Treeview", rowheight=THUMBNAIL_SIZE[1] + 6)
+        self.tree = ttk.Treeview(self.window, columns=("when", "model", "text"), style="History.Treeview")
+        self.tree.heading("#0", text="")
+        self.tree.heading("when", text="When")
+        self.tree.heading("model", text="Model")
+        self.tree.heading("text", text="Text")
+        self.tree.column("#0", width=THUMBNAIL_SIZE[0] + 24, stretch=False)
+        self.tree.column("when", width=120, stretch=False)
+        self.tree.column("model", width=140, stretch=False)
+        self.tree.pack(fill='both', expand=True, padx=10)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+        nav_frame = tk.Frame(self.window)
+        nav_frame.pack(fill='x', padx=10, pady=10)
+        self.newer_button = tk.Button(nav_frame, text="◀ Newer", command=lambda: self.load(self.offset - PAGE_SIZE))
+        self.newer_button.pack(side='left')
+        self.older_button = tk.Button(nav_frame, text="Older ▶", command=lambda: self.load(self.offset + PAGE_SIZE))
+        self.older_button.pack(side='right')
+        self.page_var = tk.StringVar(value="Loading...")
+        tk.Label(nav_frame, textvariable=self.page_var).pack()
+        self.load(0)
+
+    def _on_search_change(self, *args):
+        if self._search_job is not None: self.window.after_cancel(self._search_job)
+        self._search_job = self.window.after(self.SEARCH_DELAY_MS, self.load, 0)
+
+    def refresh(self):
+        """Reloads the first page when it is showing, e.g. after a new result was stored."""
+        if self.offset == 0: self.load(0)
+
+    def load(self, offset):
+        self._search_job = None
+        self._generation += 1
+        threading.Thread(target=self._query_thread, args=(self._generation, self.search_var.get().strip(), max(0, offset)), daemon=True).start()
+
+    def _query_thread(self, generation, query, offset):
+        from PIL import Image
+        try:
+            total, rows = self.app.history.count(query), self.app.history.page(query, offset)
+            for row in rows:
+                blob = row.pop("thumbnail")
+                row["image"] = Image.open(io.BytesIO(blob)) if blob else None
+                if row["image"] is not None: row["image"].load()
+        except Exception as e:
+            total, rows = e, []
+        self.app.root.after(0, self._show_page, generation, offset, total, rows)
+
+    def _show_page(self, generation, offset, total, rows):
+        if generation != self._generation or self.window is None: return
+        if isinstance(total, Exception):
+            self.page_var.set(f"Could not read the history: {total}")
+            return
+        from PIL import ImageTk
+        self.offset, self.total = offset, total
+        self.tree.delete(*self.tree.get_children())
+        self.images = []
+        for row in rows:
+            image = ImageTk.PhotoImage(row["image"]) if row["image"] is not None else ""
+            if image: self.images.append(image)
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["finished_at"]))
+            text = " ".join(row["snippet"].split()) or row["prompt"]
+            self.tree.insert("", "end", iid=str(row["id"]), image=image, values=(when, row["model"].split('/')[-1], text))
+        self.page_var.set(f"{offset + 1}–{offset + len(rows)} of {total}" if rows else "No results.")
+        self.newer_button.config(state=tk.NORMAL if offset > 0 else tk.DISABLED)
+        self.older_button.config(state=tk.NORMAL if offset + len(rows) < total else tk.DISABLED)
+
+    def _on_select(self, event=None):
+        selection = self.tree.selection()
+        if selection: self.app.open_history_entry(int(selection[0]))
+
+    def close(self):
+        self.window.destroy()
+        self.window = None
+        self.app.history_window = None
+
 # --- Floating Button Window ---
 class FloatingButton:
     def __init__(self, root, expand_callback, quit_callback):
@@ -367,20 +653,40 @@ class AppController:
         self.root = root
         self.root.withdraw() # Hide the main tk root window
 
-        # Create the main app window (initially hidden)
+        # Create the floating button first; it is all the user sees at startup
+        self.floater = FloatingButton(self.root, self.expand_from_floater, self.quit_app)
+        self.main_window = None
+        self.gui = None
+
+        # Handle Command-Q to quit the entire application
+        self.root.createcommand('tk::mac::Quit', self.quit_app)
+
+        # Once the floater is on screen, load the heavy modules in the background
+        # and build the (hidden) main window when they are in. Building it earlier
+        # would block the Tk thread on the same imports, freezing the floater.
+        self.root.update_idletasks()
+        self.prewarmed = threading.Event()
+        threading.Thread(target=self._prewarm, daemon=True).start()
+        self.root.after(PREWARM_POLL_MS, self._build_when_prewarmed)
+
+    def _prewarm(self):
+        try: prewarm_imports()
+        finally: self.prewarmed.set()
+
+    def _build_when_prewarmed(self):
+        if self.prewarmed.is_set(): self.build_main_window()
+        else: self.root.after(PREWARM_POLL_MS, self._build_when_prewarmed)
+
+    def build_main_window(self):
+        if self.gui is not None: return
         self.main_window = tk.Toplevel(self.root)
+        self.main_window.withdraw()
         self.gui = GeminiVisionApp(self.main_window)
         self.main_window.protocol("WM_DELETE_WINDOW", self.shrink_from_window)
-        self.main_window.withdraw()
-
-        # Create the floating button and pass the quit callback
-        self.floater = FloatingButton(self.root, self.expand_from_floater, self.quit_app)
         self.gui.set_floater(self.floater)
-        
-        # Handle Command-Q to quit the entire application
-        self.root.createcommand('tk::mac::Quit', self.quit_app)
 
     def expand_from_floater(self):
+        self.build_main_window()
         self.floater.withdraw()
         self.main_window.deiconify()
         self.main_window.lift()
@@ -393,5 +699,6 @@ class AppController:
 
     def quit_app(self):
         """Gracefully shuts down the entire application."""
+        if self.gui is not None: self.gui.job_queue.shutdown()
         # Schedule the destroy command to avoid race conditions with the menu
-        self.root.after(10, self.root.destroy)
\ No newline at end of file
+        self.root.after(10, self.root.destroy)
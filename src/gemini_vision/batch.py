@@ -0,0 +1,325 @@
+"""
+Headless batch transcription.
+
+Runs a directory (or glob) of screenshots through the same Gemini pipeline as
+the GUI, without Tk:
+
+    gemini-vision-batch ~/Screenshots -o transcripts/
+    gemini-vision-batch "archive/**/*.png" -o results.jsonl --workers 8 --rpm 60
+    gemini-vision-batch ~/Screenshots -o transcripts/ --pack 6     # six images per request
+
+Results are written one Markdown file per image, or one JSON record per line
+when the output ends in `.jsonl`. Items that already have a result are
+skipped, so an interrupted run can simply be started again.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cache import ResponseCache
+from .capture import Capture
+from .packing import PackBudget, estimate_image_tokens, generate_packed, is_pack_size_error, pack_prompt, plan_packs
+from .pipeline import DEFAULT_MODEL, DEFAULT_PROMPT, generate_markdown, make_model, read_saved_api_key, response_token_count
+from .policy import DEFAULT_DEADLINE, DEFAULT_RETRIES, RequestPolicy
+from .preprocess import PRESETS, PreprocessOptions
+from .tiling import should_tile, tiling_signature, transcribe_tiled
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff")
+# Gemini bills a small image as a fixed number of tokens; used until the
+# response reports the real count.
+IMAGE_TOKEN_ESTIMATE = 258
+# Saved in a Markdown output directory: the directory its files mirror.
+ROOT_FILE = ".gemini-vision-root"
+# Where images outside that directory are mirrored, so they cannot collide with files inside it.
+OUTSIDE_ROOT_DIR = "_abs"
+
+
+# --- Rate Limiting ---
+class RateLimiter:
+    """Sliding one-minute window limiting both requests and tokens."""
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, clock=time.monotonic, sleep=time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._window = deque() # [timestamp, tokens] per request
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Blocks until a request costing `tokens` fits in the window and returns its slot."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                while self._window and now - self._window[0][0] >= 60:
+                    self._window.popleft()
+                used = sum(slot[1] for slot in self._window)
+                requests_ok = not self.requests_per_minute or len(self._window) < self.requests_per_minute
+                # A single oversized request is let through once the window is empty.
+                tokens_ok = not self.tokens_per_minute or not self._window or used + tokens <= self.tokens_per_minute
+                if requests_ok and tokens_ok:
+                    slot = [now, tokens]
+                    self._window.append(slot)
+                    return slot
+                wait = 60 - (now - self._window[0][0])
+            self._sleep(max(wait, 0.01))
+
+    def settle(self, slot, tokens):
+        """Replaces the estimate for `slot` with the tokens actually used."""
+        with self._lock:
+            slot[1] = tokens
+
+
+# --- Inputs and Outputs ---
+def iter_inputs(sources):
+    """Expands directories and glob patterns into a sorted, de-duplicated list of image paths."""
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for dirpath, _, filenames in os.walk(source):
+                paths.update(os.path.join(dirpath, name) for name in filenames)
+        elif os.path.isfile(source):
+            paths.add(source)
+        else:
+            paths.update(glob.glob(source, recursive=True))
+    return sorted(os.path.abspath(p) for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+class MarkdownDirSink:
+    """
+    Writes `<output>/<relative path>.md` per image, keeping the image's
+    extension (`shot.png.md`) so images sharing a stem do not collide;
+    existing files count as done. Paths are relative to the inputs' common
+    directory on the first run. It is saved in the output directory, so later
+    runs with other inputs still map each image to the same file; images
+    outside it are mirrored by absolute path under `_abs/`.
+    """
+    def __init__(self, output_dir, paths):
+        self.output_dir = output_dir
+        self.root = self._load_root(paths)
+
+    def _load_root(self, paths):
+        marker = os.path.join(self.output_dir, ROOT_FILE)
+        try:
+            with open(marker, 'r', encoding='utf-8') as f: return f.read().strip()
+        except FileNotFoundError: pass
+        if not paths: return ""
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(marker, 'w', encoding='utf-8') as f: f.write(root)
+        return root
+
+    def _target(self, path):
+        try: relative = os.path.relpath(path, self.root)
+        except ValueError: relative = os.pardir # On another drive
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            drive, rest = os.path.splitdrive(os.path.abspath(path))
+            relative = os.path.join(OUTSIDE_ROOT_DIR, drive.rstrip(":"), rest.lstrip(os.sep + (os.altsep or "")))
+        return os.path.join(self.output_dir, relative + ".md")
+
+    def is_done(self, path):
+        return os.path.exists(self._target(path))
+
+    def write(self, record):
+        target = self._target(record["path"])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write-then-rename so a crash never leaves a truncated file that looks finished.
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: f.write(record["markdown"])
+        os.replace(tmp, target)
+
+    def close(self): pass
+
+
+class JsonlSink:
+    """Appends one JSON record per image; records with Markdown count as done."""
+    def __init__(self, output_path):
+        self.done = set()
+        if os.path.exists(output_path):
+            with open(output_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except ValueError: continue # Partial line from an interrupted run
+                    if "markdown" in record: self.done.add(record["path"])
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        self._file = open(output_path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def is_done(self, path):
+        return path in self.done
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def open_sink(output, paths):
+    return JsonlSink(output) if output.endswith(".jsonl") else MarkdownDirSink(output, paths)
+
+
+# --- Batch Runner ---
+def process_one(model, model_name, prompt, path, limiter, cache=None, preprocess=PRESETS["original"], tiling=False):
+    started = time.monotonic()
+    capture = Capture.from_file(path)
+    tiled = tiling and should_tile(capture.image.size)
+    variant = preprocess.signature() + (f"|{tiling_signature()}" if tiled else "")
+    key = cache.make_key(capture.image, prompt, model_name, variant, digest=capture.digest) if cache else None
+    if cache and (markdown := cache.get(key)) is not None:
+        return {"path": path, "markdown": markdown, "tokens": 0, "cached": True, "seconds": round(time.monotonic() - started, 3)}
+    if tiled:
+        # Each tile is its own request; real token counts are not tracked per tile.
+        markdown = transcribe_tiled(capture.image, prompt, model, preprocess, acquire=lambda: limiter.acquire(IMAGE_TOKEN_ESTIMATE + len(prompt) // 4))
+        if cache: cache.put(key, markdown, model=model_name, prompt=prompt)
+        return {"path": path, "markdown": markdown, "tokens": None, "cached": False, "tiled": True, "seconds": round(time.monotonic() - started, 3)}
+    upload, optimized = capture.upload_part(preprocess)
+    slot = limiter.acquire(IMAGE_TOKEN_ESTIMATE + len(prompt) // 4)
+    response = generate_markdown(model, prompt, upload)
+    tokens = response_token_count(response)
+    if tokens: limiter.settle(slot, tokens)
+    if cache: cache.put(key, response.text, model=model_name, prompt=prompt)
+    record = {"path": path, "markdown": response.text, "tokens": tokens, "cached": False, "seconds": round(time.monotonic() - started, 3)}
+    if optimized: record["bytes_saved"] = optimized.bytes_saved
+    return record
+
+
+def process_pack(model, model_name, prompt, paths, limiter, cache=None, preprocess=PRESETS["original"], tiling=False, budget=None):
+    """
+    Transcribes `paths` with as few requests as `budget` allows. Cached
+    images, tall images to tile, images whose section of a packed answer is
+    missing and the images of a pack rejected for its size go through
+    `process_one`. Returns a record or an exception per path.
+    """
+    budget = budget or PackBudget()
+    results, packable, alone = {}, [], []
+    for path in paths:
+        try:
+            started = time.monotonic()
+            capture = Capture.from_file(path)
+            if tiling and should_tile(capture.image.size):
+                alone.append(path)
+                continue
+            key = cache.make_key(capture.image, prompt, model_name, preprocess.signature(), digest=capture.digest) if cache else None
+            if cache and (markdown := cache.get(key)) is not None:
+                results[path] = {"path": path, "markdown": markdown, "tokens": 0, "cached": True, "seconds": round(time.monotonic() - started, 3)}
+                continue
+            upload, _ = capture.upload_part(preprocess)
+            packable.append((path, key, upload, estimate_image_tokens(capture.image.size)))
+        except Exception as e:
+            results[path] = e
+    for pack in plan_packs([(len(upload["data"]), tokens) for _, _, upload, tokens in packable], budget):
+        items = [packable[i] for i in pack]
+        started = time.monotonic()
+        slot = limiter.acquire(sum(tokens for *_, tokens in items) + len(pack_prompt(prompt, len(items))) // 4)
+        try: texts, response = generate_packed(model, prompt, [upload for _, _, upload, _ in items])
+        except Exception as e:
+            if not is_pack_size_error(e): # Would fail one at a time just the same
+                for path, *_ in items: results[path] = e
+                continue
+            texts, response = [None] * len(items), None # Too large together; try one at a time
+        tokens = response_token_count(response) if response is not None else None
+        if tokens: limiter.settle(slot, tokens)
+        for (path, key, _, _), text in zip(items, texts):
+            if text is None:
+                alone.append(path)
+                continue
+            if cache: cache.put(key, text, model=model_name, prompt=prompt)
+            # Tokens are billed per request, so they are reported for the whole pack.
+            results[path] = {"path": path, "markdown": text, "tokens": None, "pack_tokens": tokens, "packed": len(items),
+                             "cached": False, "seconds": round(time.monotonic() - started, 3)}
+    for path in alone:
+        try: results[path] = process_one(model, model_name, prompt, path, limiter, cache, preprocess, tiling)
+        except Exception as e: results[path] = e
+    return [results[path] for path in paths]
+
+
+def run_batch(paths, sink, model, prompt=DEFAULT_PROMPT, workers=4, limiter=None, log=print, model_name="", cache=None, preprocess=PRESETS["original"], tiling=False, budget=None):
+    """
+    Processes `paths` with up to `workers` concurrent requests, streaming each
+    result to `sink` as soon as it arrives. With a `PackBudget` allowing more
+    than one image per request, images are sent in packs.
+    Returns (done, skipped, failed).
+    """
+    limiter = limiter or RateLimiter()
+    pending = [p for p in paths if not sink.is_done(p)]
+    skipped = len(paths) - len(pending)
+    done = failed = 0
+    if skipped: log(f"Skipping {skipped} already processed item(s).")
+    size = budget.images_per_pack if budget else 1
+    groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if size > 1: futures = {pool.submit(process_pack, model, model_name, prompt, group, limiter, cache, preprocess, tiling, budget): group for group in groups}
+        else: futures = {pool.submit(process_one, model, model_name, prompt, group[0], limiter, cache, preprocess, tiling): group for group in groups}
+        for future in as_completed(futures):
+            group = futures[future]
+            try: results = future.result() if size > 1 else [future.result()]
+            except Exception as e: results = [e]
+            for path, result in zip(group, results):
+                if isinstance(result, Exception):
+                    failed += 1
+                    log(f"[{done + failed}/{len(pending)}] FAILED {path}: {result}")
+                    continue
+                sink.write(result)
+                done += 1
+                log(f"[{done + failed}/{len(pending)}] {path}")
+    return done, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gemini-vision-batch", description="Transcribe a directory of screenshots with Gemini.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns.")
+    parser.add_argument("-o", "--output", required=True, help="Output directory, or a .jsonl file.")
+    parser.add_argument("-p", "--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, help="Gemini model name, or e.g. 'fake:latency=0.5' for a local fake.")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="Defaults to $GEMINI_API_KEY, then the key saved by the app.")
+    parser.add_argument("-j", "--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=int, help="Maximum requests per minute.")
+    parser.add_argument("--tpm", type=int, help="Maximum tokens per minute.")
+    parser.add_argument("--preprocess", default="original", help=f"Upload optimization: a preset ({', '.join(PRESETS)}) or key=value list, see gemini_vision.preprocess.")
+    parser.add_argument("--tile", action="store_true", help="Split very tall images into overlapping tiles transcribed in parallel.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the response cache.")
+    parser.add_argument("--pack", type=int, default=1, metavar="N", help="Send up to N images per request and split the answer.")
+    parser.add_argument("--output-tokens-per-image", type=int, default=1000, help="Expected answer length per image, limiting how many are packed.")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="Seconds after which a request (including retries) fails.")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Retries for transient errors such as rate limits and 5xx responses.")
+    parser.add_argument("--hedge-model", help="Faster model also asked when a request is slower than usual; the first answer wins.")
+    parser.add_argument("--hedge-after", type=float, default=5.0, help="Seconds before hedging, until enough requests have been timed.")
+    parser.add_argument("--hedge-percentile", type=float, default=0.9, help="Hedge requests slower than this percentile of recent ones.")
+    args = parser.parse_args(argv)
+
+    api_key = args.api_key or read_saved_api_key()
+    if not api_key and not args.model.startswith("fake"):
+        parser.error("No API key found. Pass --api-key or set GEMINI_API_KEY.")
+    paths = iter_inputs(args.inputs)
+    if not paths:
+        print("No images found.", file=sys.stderr)
+        return 1
+
+    cache = None if args.no_cache else ResponseCache()
+    policy = RequestPolicy(args.deadline, args.retries, hedge_percentile=args.hedge_percentile, hedge_after=args.hedge_after)
+    hedge = make_model(api_key, args.hedge_model) if args.hedge_model else None
+    model = policy.wrap(make_model(api_key, args.model), args.model, hedge, args.hedge_model)
+    budget = PackBudget(args.pack, output_tokens_per_image=args.output_tokens_per_image, max_input_tokens=args.tpm) if args.pack > 1 else None
+    sink = open_sink(args.output, paths)
+    try:
+        done, skipped, failed = run_batch(paths, sink, model, args.prompt, args.workers, RateLimiter(args.rpm, args.tpm), log=lambda msg: print(msg, file=sys.stderr), model_name=args.model, cache=cache, preprocess=PreprocessOptions.from_spec(args.preprocess), tiling=args.tile, budget=budget)
+    finally:
+        sink.close()
+    notes = ", ".join(filter(None, [model.describe(), cache.summary() if cache else ""]))
+    print(f"Processed {done}, skipped {skipped}, failed {failed}" + (f", {notes}." if notes else "."), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Content-addressed on-disk cache of Gemini responses."""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .pipeline import CACHE_DIR
+
+DEFAULT_CACHE_DIR = os.path.join(CACHE_DIR, "responses")
+# Eviction frees space down to this fraction of `max_bytes`, so a full cache is not rescanned on every write.
+EVICT_TO = 0.85
+
+
+def normalize_prompt(prompt):
+    """Collapses whitespace so trivially different prompts share an entry."""
+    return " ".join(prompt.split())
+
+
+def image_digest(image):
+    """Hashes decoded pixels, so the same screenshot saved twice hashes the same."""
+    h = hashlib.sha256()
+    h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Stores one JSON file per response under `directory`, named by the hash of
+    (pixels, normalized prompt, model). Entries older than `ttl` seconds are
+    ignored and the least recently used entries are evicted once the
+    directory grows past `max_bytes`, down to `EVICT_TO` of it. Writes go through a temporary file and
+    `os.replace`, so concurrent workers never see a partial entry.
+
+    `fallback(key, since)` is consulted when an entry is missing, e.g.
+    `History.markdown_for_key`, so results that were evicted for size but
+    kept elsewhere are not requested again. It returns (markdown, created_at)
+    or None, and the result is written back into the cache with its original
+    creation time, so it still expires on schedule. `since` is the oldest
+    creation time the TTL still allows (None without a TTL), and expired
+    entries never fall back.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=64 * 1024 * 1024, ttl=30 * 24 * 3600, fallback=None):
+        self.directory = directory
+        self.fallback = fallback
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._size = None # Bytes on disk, computed lazily on the first write
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image, prompt, model_name, variant="", digest=None):
+        """`variant` distinguishes uploads of the same pixels, e.g. preprocessing settings."""
+        h = hashlib.sha256()
+        for part in (digest or image_digest(image), normalize_prompt(prompt), model_name, variant):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit: self.hits += 1
+            else: self.misses += 1
+
+    def get(self, key):
+        """Returns the cached Markdown for `key`, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f: entry = json.load(f)
+        except (OSError, ValueError):
+            return self._get_fallback(key)
+        if self.ttl and time.time() - entry.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            self._count(False)
+            return None
+        try: os.utime(path) # Mark as recently used for LRU eviction
+        except OSError: pass
+        self._count(True)
+        return entry["markdown"]
+
+    def _get_fallback(self, key):
+        found = self.fallback(key, time.time() - self.ttl if self.ttl else None) if self.fallback else None
+        self._count(found is not None)
+        if found is None: return None
+        markdown, created_at = found
+        self.put(key, markdown, created_at=created_at, restored=True)
+        return markdown
+
+    def put(self, key, markdown, created_at=None, **metadata):
+        """`created_at` defaults to now; the TTL counts from it."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = dict(metadata, markdown=markdown, created_at=time.time() if created_at is None else created_at)
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f: f.write(data)
+            try: replaced = os.path.getsize(path) # Overwriting an entry only adds the difference
+            except OSError: replaced = 0
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        with self._lock:
+            if self._size is not None: self._size += len(data) - replaced
+        self._evict_if_needed()
+
+    def _entries(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if not name.endswith(".json"): continue
+                path = os.path.join(dirpath, name)
+                try: st = os.stat(path)
+                except OSError: continue # Evicted by another worker
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes: return
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes * EVICT_TO: break
+                self._remove(path)
+                total -= size
+            self._size = total
+
+    @staticmethod
+    def _remove(path):
+        try: os.remove(path)
+        except OSError: pass
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries(): self._remove(path)
+            self._size = 0
+
+    def summary(self):
+        total = self.hits + self.misses
+        return f"cache {self.hits}/{total} hits" if total else "cache empty"
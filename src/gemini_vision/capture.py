@@ -0,0 +1,163 @@
+"""
+Screenshots held in memory, and the backends that take them.
+
+A `Capture` keeps the encoded bytes exactly as captured and decodes them at
+most once; the preview, the cache key and the upload all read from the same
+object instead of going back to disk.
+
+The backend is chosen with $GEMINI_VISION_CAPTURE:
+
+    screencapture          macOS interactive window capture (default)
+    file:/path/to/img.png  re-read a file on every capture
+    stdin                  read one image from standard input
+    command:CMD            run CMD and read the image from its stdout,
+                           e.g. "command:import -window root png:-" on Linux
+"""
+import hashlib
+import io
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from .instrumentation import Timings
+
+
+class Capture:
+    """One screenshot: its encoded bytes plus a lazily decoded image and hashes."""
+    def __init__(self, data, source=None):
+        self.data = data
+        self.source = source
+        self.created_at = time.time()
+        self._image = None
+        self._users = 0 # Jobs currently working on the decoded image
+        self._released = False
+        self._digest = None
+        self._data_digest = None
+        self._lock = threading.Lock()
+        self.timings = Timings() # Capture-side stages, shared by every job made from this capture
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f: return cls(f.read(), source=path)
+
+    @property
+    def image(self):
+        """
+        The decoded PIL image, shared by every reader. Do not modify it in place.
+        Once released, it is only kept while a job is using the capture.
+        """
+        with self._lock:
+            if self._image is None:
+                from PIL import Image
+                with self.timings.stage("decode"):
+                    image = Image.open(io.BytesIO(self.data))
+                    image.load()
+                if self._users or not self._released: self._image = image
+                return image
+            return self._image
+
+    @property
+    def digest(self):
+        """Hash of the decoded pixels, as used for response cache keys."""
+        if self._digest is None:
+            from .cache import image_digest
+            image = self.image
+            with self.timings.stage("hash"): self._digest = image_digest(image)
+        return self._digest
+
+    @property
+    def data_digest(self):
+        """Hash of the encoded bytes; cheaper than `digest` when only identity matters."""
+        if self._data_digest is None:
+            self._data_digest = hashlib.sha256(self.data).hexdigest()
+        return self._data_digest
+
+    @property
+    def mime_type(self):
+        from PIL import Image
+        return Image.MIME.get(self.image.format, "image/png")
+
+    def upload_part(self, options):
+        """
+        Returns (content part for `generate_content`, OptimizedImage or None).
+        Without preprocessing the captured bytes are sent as they are, avoiding a re-encode.
+        """
+        if not options.format:
+            return {"mime_type": self.mime_type, "data": self.data}, None
+        from .preprocess import optimize_image
+        optimized = optimize_image(self.image, options, len(self.data))
+        return optimized.as_blob(), optimized
+
+    @contextmanager
+    def in_use(self):
+        """Keeps the decoded image while a job works on it; a `release` meanwhile takes effect afterwards."""
+        with self._lock: self._users += 1
+        try: yield self
+        finally:
+            with self._lock:
+                self._users -= 1
+                if self._released and not self._users: self._image = None
+
+    def release(self):
+        """
+        Drops the decoded image, now or once the jobs using it finish; called
+        when a newer capture replaces this one, or when its owner is done with it.
+        """
+        with self._lock:
+            self._released = True
+            if not self._users: self._image = None
+
+
+# --- Capture Backends ---
+class ScreencaptureBackend:
+    """macOS `screencapture -i`. Returns None when the user cancels."""
+    def capture(self):
+        # screencapture can only write to a file, so use a private temporary one.
+        directory = tempfile.mkdtemp(prefix="gemini-vision-")
+        path = os.path.join(directory, "capture.png")
+        try:
+            subprocess.run(["screencapture", "-i", path], check=True)
+            if not os.path.exists(path) or not os.path.getsize(path): return None
+            return Capture.from_file(path)
+        finally:
+            if os.path.exists(path): os.remove(path)
+            os.rmdir(directory)
+
+
+class FileBackend:
+    def __init__(self, path):
+        self.path = path
+
+    def capture(self):
+        return Capture.from_file(self.path)
+
+
+class StdinBackend:
+    def capture(self):
+        data = sys.stdin.buffer.read()
+        return Capture(data, source="<stdin>") if data else None
+
+
+class CommandBackend:
+    def __init__(self, command):
+        self.command = command
+
+    def capture(self):
+        result = subprocess.run(shlex.split(self.command), check=True, stdout=subprocess.PIPE)
+        return Capture(result.stdout, source=self.command) if result.stdout else None
+
+
+def get_backend(spec=None):
+    """Parses a backend spec, by default from $GEMINI_VISION_CAPTURE."""
+    spec = spec or os.environ.get("GEMINI_VISION_CAPTURE", "screencapture")
+    kind, _, argument = spec.partition(":")
+    if kind == "screencapture": return ScreencaptureBackend()
+    if kind == "stdin": return StdinBackend()
+    if kind == "file" and argument: return FileBackend(argument)
+    if kind == "command" and argument: return CommandBackend(argument)
+    raise ValueError(f"Unknown capture backend {spec!r}.")
@@ -0,0 +1,208 @@
+"""
+Client of the background daemon (see `daemon.py`), and the `gemini-vision-ask` command.
+
+The daemon already has the interpreter, PIL and the Gemini SDK loaded and its
+models configured, so a request from here costs a Unix socket round trip:
+
+    gemini-vision-ask screenshot.png -p "Summarize this"
+    screencapture -i /tmp/s.png && gemini-vision-ask /tmp/s.png | pbcopy
+    gemini-vision-ask --status
+
+This module only uses the standard library so that it starts quickly.
+"""
+import argparse
+import base64
+import codecs
+import hashlib
+import http.client
+import json
+import os
+import socket
+import sys
+import time
+
+from .pipeline import CACHE_DIR, DEFAULT_MODEL, DEFAULT_PROMPT
+
+DAEMON_SOCKET = os.environ.get("GEMINI_VISION_DAEMON_SOCKET") or os.path.join(CACHE_DIR, "daemon.sock")
+
+
+def key_fingerprint(api_key):
+    """Identifies an API key without revealing it, so a client can tell whether the daemon uses the same one."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+
+
+class DaemonError(Exception):
+    """An error reported by the daemon. Subclasses carry the remote exception's class name."""
+
+
+def remote_error(name, message):
+    """
+    An exception named like the one raised in the daemon, so that callers
+    classifying errors by class name (see `policy.is_transient`) still can.
+    """
+    return type(name or "DaemonError", (DaemonError,), {})(message)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DaemonClient:
+    """HTTP over the daemon's Unix socket; one connection per request."""
+    def __init__(self, path=DAEMON_SOCKET, timeout=600):
+        self.path = path
+        self.timeout = timeout
+
+    def _request(self, method, url, payload=None, timeout=None):
+        connection = _UnixConnection(self.path, timeout or self.timeout)
+        body = json.dumps(payload).encode() if payload is not None else None
+        connection.request(method, url, body=body, headers={"Content-Type": "application/json"} if body else {})
+        response = connection.getresponse()
+        if response.status >= 400:
+            try: error = json.loads(response.read())
+            except ValueError: error = {}
+            connection.close()
+            raise remote_error(error.get("type"), error.get("error") or f"Daemon answered {response.status} {response.reason}.")
+        return connection, response
+
+    def _json(self, method, url, payload=None, timeout=None):
+        connection, response = self._request(method, url, payload, timeout)
+        try: return json.loads(response.read())
+        finally: connection.close()
+
+    def _stream(self, url, payload):
+        connection, response = self._request("POST", url, payload)
+        decoder = codecs.getincrementaldecoder('utf-8')() # A read may end inside a character
+        try:
+            while True:
+                # With chunked encoding, read1 returns whatever has arrived, at most one chunk.
+                data = response.read1(65536)
+                if not data: break
+                if text := decoder.decode(data): yield text
+        except http.client.IncompleteRead:
+            raise DaemonError("The daemon stopped in the middle of the answer.")
+        finally:
+            connection.close()
+
+    def ping(self, timeout=0.5):
+        """The daemon's status, or None if it is not running."""
+        if not os.path.exists(self.path): return None
+        try: return self._json("GET", "/health", timeout=timeout)
+        except (OSError, DaemonError, ValueError): return None
+
+    def transcribe(self, data, prompt=DEFAULT_PROMPT, model=DEFAULT_MODEL, preprocess="original", tile=False, stream=True):
+        """
+        Runs the daemon's full pipeline (cache, preprocessing, tiling) on the
+        image bytes `data`. Yields Markdown fragments with `stream`, otherwise
+        returns the result record.
+        """
+        payload = {"image": base64.b64encode(data).decode('ascii'), "prompt": prompt, "model": model, "preprocess": preprocess, "tile": tile}
+        if stream: return self._stream("/transcribe?stream=1", payload)
+        return self._json("POST", "/transcribe", payload)
+
+    def generate(self, model, prompt, part, stream=False):
+        """One raw `generate_content` call on the daemon's warm model; see `DaemonModel`."""
+        payload = {"model": model, "prompt": prompt, "mime_type": part["mime_type"], "image": base64.b64encode(part["data"]).decode('ascii')}
+        if stream: return self._stream("/generate?stream=1", payload)
+        return self._json("POST", "/generate", payload)
+
+    def shutdown(self):
+        return self._json("POST", "/shutdown", {})
+
+
+class _Text:
+    """Just enough of a Gemini response for `stream_markdown` and `response_token_count`."""
+    def __init__(self, text, total_token_count=None):
+        self.text = text
+        self.usage_metadata = type("Usage", (), {"total_token_count": total_token_count})()
+
+
+class DaemonModel:
+    """
+    A model whose requests are sent by the daemon, so they use its warm SDK
+    client. Has the `generate_content` interface of a Gemini model.
+    """
+    def __init__(self, client, model_name):
+        self.client = client
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False):
+        prompt = next((c for c in contents if isinstance(c, str)), "")
+        part = next(c for c in contents if not isinstance(c, str))
+        if not isinstance(part, dict): # A PIL image
+            from .preprocess import PRESETS, encode_for_upload
+            part = encode_for_upload(part, PRESETS["original"])
+        if stream: return (_Text(text) for text in self.client.generate(self.model_name, prompt, part, stream=True))
+        result = self.client.generate(self.model_name, prompt, part)
+        return _Text(result["text"], result.get("tokens"))
+
+
+def daemon_or_local(fallback, client=None):
+    """
+    A `models(api_key, model_name)` factory using the daemon while it runs
+    with the same API key, and `fallback` (e.g. a `ModelPool`) otherwise, so
+    requests are never billed to another key than the caller's.
+    """
+    client = client or DaemonClient()
+    checked = {"at": 0.0, "status": None}
+    def models(api_key, model_name):
+        if time.monotonic() - checked["at"] > 5: # Notice a daemon started or stopped meanwhile
+            checked.update(at=time.monotonic(), status=client.ping())
+        status = checked["status"]
+        if status is not None and status.get("api_key") == key_fingerprint(api_key): return DaemonModel(client, model_name)
+        return fallback(api_key, model_name)
+    return models
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gemini-vision-ask", description="Ask the gemini-vision daemon about an image.")
+    parser.add_argument("image", nargs="?", help="Image file, or '-' for standard input. Defaults to a new capture.")
+    parser.add_argument("-p", "--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL)
+    parser.add_argument("--preprocess", default="original", help="Upload optimization preset or spec, see gemini_vision.preprocess.")
+    parser.add_argument("--tile", action="store_true", help="Split very tall images into tiles.")
+    parser.add_argument("--json", action="store_true", help="Wait for the whole answer and print the result record as JSON.")
+    parser.add_argument("--status", action="store_true", help="Print the daemon's status and exit.")
+    parser.add_argument("--stop", action="store_true", help="Stop the daemon.")
+    parser.add_argument("--socket", default=DAEMON_SOCKET)
+    args = parser.parse_args(argv)
+
+    client = DaemonClient(args.socket)
+    status = client.ping()
+    if status is None:
+        print(f"No daemon is listening on {args.socket}. Start one with gemini-vision-daemon.", file=sys.stderr)
+        return 2
+    if args.status or args.stop:
+        print(json.dumps(client.shutdown() if args.stop else status, indent=2))
+        return 0
+
+    if args.image == "-": data = sys.stdin.buffer.read()
+    elif args.image:
+        with open(args.image, 'rb') as f: data = f.read()
+    else:
+        from .capture import get_backend
+        capture = get_backend().capture()
+        if capture is None: return 1 # Cancelled
+        data = capture.data
+    try:
+        if args.json:
+            print(json.dumps(client.transcribe(data, args.prompt, args.model, args.preprocess, args.tile, stream=False), ensure_ascii=False))
+            return 0
+        for text in client.transcribe(data, args.prompt, args.model, args.preprocess, args.tile):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+    except DaemonError as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
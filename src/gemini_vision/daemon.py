@@ -0,0 +1,297 @@
+"""
+Long-running daemon that keeps the pipeline warm.
+
+Starting the GUI or a script pays for the interpreter, PIL and the Gemini SDK
+every time, and each request used to configure the SDK and build a new model.
+The daemon does all of that once and then answers requests over HTTP on a
+Unix socket in the cache directory, readable only by the current user:
+
+    GET  /health              status, warm models and counters
+    POST /transcribe          the full pipeline (cache, preprocessing, tiling, history)
+    POST /transcribe?stream=1 the same, streaming Markdown as it is generated
+    POST /generate[?stream=1] one raw request to a warm model, used by `DaemonModel`
+    POST /shutdown
+
+Request bodies are JSON with the image base64 encoded. See `client.py` for
+the client and the `gemini-vision-ask` command.
+
+    gemini-vision-daemon --warm models/gemini-2.5-flash
+"""
+import argparse
+import base64
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+from .cache import ResponseCache
+from .capture import Capture
+from .client import DAEMON_SOCKET, key_fingerprint
+from .history import History
+from .jobs import DONE, FAILED, Job, JobQueue
+from .pipeline import DEFAULT_MODEL, DEFAULT_PROMPT, ModelPool, generate_markdown, read_saved_api_key, response_token_count, stream_markdown
+from .policy import RequestPolicy
+from .preprocess import PreprocessOptions
+
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+class BadRequest(Exception):
+    pass
+
+
+class DaemonService:
+    """The warm state shared by all connections: model pool, job queue, caches and counters."""
+    def __init__(self, api_key, workers=4, cache=None, history=None, policy=None):
+        self.api_key = api_key
+        self.models = ModelPool()
+        self.cache = cache
+        self.history = history
+        self.started_at = time.time()
+        self.requests = 0
+        self._listeners = {} # job -> queue of updates for the connection waiting on it
+        self._lock = threading.Lock()
+        self.job_queue = JobQueue(workers, cache, on_update=self._notify, on_progress=self._notify, policy=policy, models=self.models)
+
+    def _notify(self, job):
+        if job.finished and job.status == DONE and self.history is not None: self._record_history(job)
+        with self._lock: listener = self._listeners.get(job)
+        if listener is not None: listener.put(job)
+
+    def _record_history(self, job):
+        if job.cached and (self.history.markdown_for_key(job.cache_key) or (None,))[0] == job.markdown: return
+        try:
+            self.history.add(job.markdown, job.prompt, job.model_name, image=job.capture.image, source="daemon",
+                             cache_key=job.cache_key, captured_at=job.capture.created_at, seconds=job.finished_at - job.started_at)
+        except Exception: pass # History must never fail a request
+
+    def submit(self, job):
+        """Queues `job` and returns a queue receiving the job after each update."""
+        listener = queue.Queue()
+        with self._lock:
+            self._listeners[job] = listener
+        self.count_request()
+        self.job_queue.submit(job)
+        return listener
+
+    def forget(self, job):
+        """Stops sending updates for `job` and drops it from the queue, which would otherwise keep its request bytes."""
+        with self._lock: self._listeners.pop(job, None)
+        self.job_queue.discard(job)
+
+    def count_request(self):
+        with self._lock: self.requests += 1
+
+    def status(self):
+        return {"pid": os.getpid(), "uptime": round(time.time() - self.started_at, 1), "requests": self.requests, "api_key": key_fingerprint(self.api_key),
+                "warm_models": self.models.names(), "cache": self.cache.summary() if self.cache else None}
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Needed for chunked streaming responses
+    server_version = "gemini-vision-daemon"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        return "local" # Unix socket peers have no address
+
+    def log_message(self, format, *args):
+        if self.server.verbose: super().log_message(format, *args)
+
+    # --- Responses ---
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, error):
+        self._send_json(status, {"error": str(error), "type": type(error).__name__})
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/markdown; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _send_chunk(self, text):
+        data = text.encode('utf-8')
+        if data: self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- Requests ---
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES: raise BadRequest("Request too large.")
+        try: payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError: raise BadRequest("The body must be JSON.")
+        if "image" in payload:
+            try: payload["image"] = base64.b64decode(payload["image"], validate=True)
+            except ValueError: raise BadRequest("'image' must be base64.")
+        return payload
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health": self._send_json(200, self.service.status())
+        else: self._send_error(404, BadRequest(f"No such endpoint: {self.path}"))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        stream = parse_qs(url.query).get("stream") == ["1"]
+        handlers = {"/transcribe": self._transcribe, "/generate": self._generate, "/shutdown": self._shutdown}
+        if url.path not in handlers:
+            self._send_error(404, BadRequest(f"No such endpoint: {url.path}"))
+            return
+        try: payload = self._read_json()
+        except BadRequest as e:
+            self._send_error(400, e)
+            self.close_connection = True
+            return
+        handlers[url.path](payload, stream)
+
+    def _transcribe(self, payload, stream):
+        if not payload.get("image"):
+            self._send_error(400, BadRequest("'image' is required."))
+            return
+        try: preprocess = PreprocessOptions.from_spec(payload.get("preprocess") or "original")
+        except (TypeError, ValueError) as e:
+            self._send_error(400, e)
+            return
+        job = Job(Capture(payload["image"], source="daemon"), payload.get("prompt") or DEFAULT_PROMPT, payload.get("model") or DEFAULT_MODEL,
+                  preprocess, self.service.api_key, tiling=bool(payload.get("tile")))
+        updates = self.service.submit(job)
+        job.capture.release() # Nothing else needs the image once the job is done with it
+        sent = "" # Markdown already streamed
+        try:
+            while True:
+                job = updates.get()
+                markdown = job.markdown
+                # Only appended text can be streamed; a revised prefix would have to wait for the end.
+                if stream and job.status != FAILED and len(markdown) > len(sent) and markdown.startswith(sent):
+                    if not sent: self._start_stream()
+                    self._send_chunk(markdown[len(sent):])
+                    sent = markdown
+                if job.finished: break
+        except OSError: # The client went away
+            self.service.job_queue.cancel(job)
+            self.close_connection = True
+            return
+        finally:
+            self.service.forget(job)
+        if job.status != DONE or (sent and not job.markdown.startswith(sent)):
+            if sent: self.close_connection = True # Ends the stream without its last chunk, which the client reports as an error
+            else: self._send_error(502 if job.status == FAILED else 499, job.error or RuntimeError(job.summary()))
+            return
+        if stream:
+            if not sent: self._start_stream()
+            self._end_stream()
+        else:
+            self._send_json(200, {"markdown": job.markdown, "cached": job.cached, "summary": job.summary(),
+                                  "stages_ms": job.all_timings().milliseconds(), "cache_key": job.cache_key})
+
+    def _generate(self, payload, stream):
+        if not payload.get("image") or not payload.get("model"):
+            self._send_error(400, BadRequest("'image' and 'model' are required."))
+            return
+        self.service.count_request()
+        part = {"mime_type": payload.get("mime_type") or "image/png", "data": payload["image"]}
+        try:
+            model = self.service.models(self.service.api_key, payload["model"])
+            if not stream:
+                response = generate_markdown(model, payload.get("prompt") or DEFAULT_PROMPT, part)
+                self._send_json(200, {"text": response.text, "tokens": response_token_count(response)})
+                return
+            chunks = stream_markdown(model, payload.get("prompt") or DEFAULT_PROMPT, part)
+            first = next(chunks, "")
+        except Exception as e:
+            self._send_error(502, e)
+            return
+        self._start_stream()
+        try:
+            self._send_chunk(first)
+            for text in chunks: self._send_chunk(text)
+            self._end_stream()
+        except Exception: # Client gone, or the model failed mid-stream
+            self.close_connection = True
+
+    def _shutdown(self, payload, stream):
+        self._send_json(200, {"stopping": True, **self.service.status()})
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        _remove_stale_socket(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        umask = os.umask(0o177) # The socket is created owner-only, with no window where others could connect
+        try: super().__init__(path, DaemonHandler)
+        finally: os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        try: os.remove(self.server_address)
+        except OSError: pass
+
+
+def _remove_stale_socket(path):
+    """Removes a socket left behind by a daemon that died; refuses to replace a live one."""
+    if not os.path.exists(path): return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        raise SystemExit(f"A daemon is already listening on {path}.")
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+    finally:
+        probe.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gemini-vision-daemon", description="Serve the gemini-vision pipeline on a local Unix socket.")
+    parser.add_argument("--socket", default=DAEMON_SOCKET)
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="Defaults to $GEMINI_API_KEY, then the key saved by the app.")
+    parser.add_argument("-j", "--workers", type=int, default=4, help="Requests processed concurrently.")
+    parser.add_argument("--warm", action="append", default=[], metavar="MODEL", help="Configure this model at startup; may be repeated.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the response cache.")
+    parser.add_argument("--no-history", action="store_true", help="Do not record results in the history.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args(argv)
+
+    api_key = args.api_key or read_saved_api_key()
+    service = DaemonService(api_key, args.workers, None if args.no_cache else ResponseCache(), None if args.no_history else History(), RequestPolicy())
+    # Load everything a first request would otherwise wait for.
+    import PIL.Image
+    PIL.Image.init()
+    for name in args.warm or ([DEFAULT_MODEL] if api_key else []): service.models(api_key, name)
+    server = DaemonServer(args.socket, service, args.verbose)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"Listening on {args.socket} (pid {os.getpid()}).", file=sys.stderr)
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally:
+        server.server_close()
+        service.job_queue.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Delta capture: avoid or shrink requests for screenshots that barely changed.
+
+Users often re-capture the same window after a small edit. The new capture is
+compared with the previous one processed with the same prompt and model:
+
+  * a perceptual hash (dHash) quickly rules out unrelated screenshots;
+  * a pixel diff finds the bounding box of what changed. If nothing changed
+    beyond a few pixels of noise, the previous result is reused without a
+    request. If only a region changed, just that region is sent together
+    with the previous Markdown, and the model returns the updated document.
+
+A reused result still describes the capture it was made from, so that
+capture stays the baseline for the next comparison; a series of small edits
+cannot drift away from the transcribed content unnoticed.
+"""
+import threading
+from collections import OrderedDict
+
+REUSE, REGION, FULL = "reuse", "region", "full"
+
+# Captures whose hashes differ in more bits than this are treated as unrelated.
+MAX_HASH_DISTANCE = 10
+# Per-channel difference below which pixels count as unchanged (compression noise, antialiasing).
+PIXEL_TOLERANCE = 24
+# Changes at most this many pixels wide and high are noise; anything larger, even a single changed digit, is sent.
+MAX_NOISE_PIXELS = 2
+# Regions larger than this fraction are sent as a full request instead.
+MAX_REGION_FRACTION = 0.4
+REGION_PADDING = 24
+
+REGION_PROMPT = ("{prompt}\n\nThe attached image shows only the changed part of a screenshot whose previous "
+                 "transcription is given below. Return the complete, updated Markdown for the whole screenshot: "
+                 "keep everything outside the changed part as it is and reflect what the attached image now shows.\n\n"
+                 "Previous transcription:\n\n{previous}")
+
+
+def dhash(image, size=8):
+    """64-bit difference hash of the image's coarse brightness gradients."""
+    small = image.convert("L").resize((size + 1, size))
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left, right = pixels[row * (size + 1) + col], pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def changed_region(previous, current, tolerance=PIXEL_TOLERANCE):
+    """Bounding box of pixels that differ between two images of the same size, or None."""
+    from PIL import ImageChops
+    diff = ImageChops.difference(previous.convert("L"), current.convert("L"))
+    return diff.point(lambda p: 255 if p > tolerance else 0).getbbox()
+
+
+def region_prompt(prompt, previous_markdown):
+    return REGION_PROMPT.format(prompt=prompt, previous=previous_markdown)
+
+
+class DeltaDecision:
+    def __init__(self, kind, previous_markdown=None, box=None):
+        self.kind = kind
+        self.previous_markdown = previous_markdown
+        self.box = box
+
+
+class DeltaTracker:
+    """
+    Remembers the last transcribed capture (in grayscale, so the capture
+    itself can be freed) and its result per context (prompt, model and upload
+    settings), and decides how to handle the next capture. Also counts the
+    requests and upload bytes avoided.
+    """
+    def __init__(self, max_contexts=8):
+        self.max_contexts = max_contexts
+        self.requests_avoided = 0
+        self.bytes_avoided = 0
+        self._previous = OrderedDict() # context -> (grayscale image, hash, markdown)
+        self._lock = threading.Lock()
+
+    def decide(self, image, context, allow_region=True):
+        with self._lock: previous = self._previous.get(context)
+        if previous is None: return DeltaDecision(FULL)
+        previous_gray, previous_hash, markdown = previous
+        if image.size != previous_gray.size: return DeltaDecision(FULL)
+        gray = image.convert("L")
+        if hamming(dhash(gray), previous_hash) > MAX_HASH_DISTANCE: return DeltaDecision(FULL)
+        box = changed_region(previous_gray, gray)
+        if box is None or (box[2] - box[0] <= MAX_NOISE_PIXELS and box[3] - box[1] <= MAX_NOISE_PIXELS):
+            return DeltaDecision(REUSE, markdown)
+        width, height = image.size
+        if not allow_region or (box[2] - box[0]) * (box[3] - box[1]) > MAX_REGION_FRACTION * width * height: return DeltaDecision(FULL)
+        box = (max(0, box[0] - REGION_PADDING), max(0, box[1] - REGION_PADDING), min(width, box[2] + REGION_PADDING), min(height, box[3] + REGION_PADDING))
+        return DeltaDecision(REGION, markdown, box)
+
+    def remember(self, image, context, markdown):
+        """Makes `image` the baseline for `context`; `markdown` must be its transcription."""
+        gray = image.convert("L")
+        entry = (gray, dhash(gray), markdown)
+        with self._lock:
+            self._previous[context] = entry
+            self._previous.move_to_end(context)
+            while len(self._previous) > self.max_contexts: self._previous.popitem(last=False)
+
+    def record_savings(self, full_bytes, sent_bytes=0):
+        """`sent_bytes=0` means the request was skipped altogether."""
+        with self._lock:
+            if not sent_bytes: self.requests_avoided += 1
+            self.bytes_avoided += max(full_bytes - sent_bytes, 0)
+
+    def summary(self):
+        return f"delta saved {self.requests_avoided} request(s), {self.bytes_avoided / 1024:.0f} KB"
@@ -0,0 +1,115 @@
+"""A local stand-in for `genai.GenerativeModel` used by tests and benchmarks."""
+import random
+import threading
+import time
+
+
+FILLER = ("Lorem ipsum dolor sit amet, **consectetur** adipiscing elit, sed do eiusmod tempor "
+          "incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis `nostrud` "
+          "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat.")
+
+
+class ServiceUnavailable(Exception):
+    """Named like the google.api_core error for HTTP 503, so it counts as transient."""
+
+
+class InvalidArgument(Exception):
+    """Named like the google.api_core error for HTTP 400, which is not retried."""
+
+
+class FakeUsage:
+    def __init__(self, total_token_count):
+        self.total_token_count = total_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, total_token_count):
+        self.text = text
+        self.usage_metadata = FakeUsage(total_token_count)
+
+
+class FakeModel:
+    """
+    Answers `generate_content` after a fixed delay with deterministic Markdown.
+
+    Specs look like "fake" or "fake:latency=0.5,chunk_delay=0.05,chars=4000"
+    and are what `make_model` receives when a fake model name is selected.
+    With `stream=True`, the first chunk arrives after `latency` and each
+    following line after `chunk_delay`. `chars` pads the answer with filler
+    paragraphs to roughly that length.
+
+    Failures and slow answers can be injected: `fail_first` calls raise
+    `ServiceUnavailable`, then each call fails with probability `fail_rate`
+    (or raises `InvalidArgument` with probability `fatal_rate`), and takes
+    `tail_latency` instead of `latency` with probability `tail_rate`. `seed`
+    makes the random choices repeatable. In answers to packed requests (see
+    `packing`), each image's delimiter is left out with probability
+    `drop_delimiter`.
+    """
+    def __init__(self, latency=0.0, chunk_delay=0.0, chars=0, fail_first=0, fail_rate=0.0, fatal_rate=0.0,
+                 tail_rate=0.0, tail_latency=0.0, drop_delimiter=0.0, seed=None):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chars = int(chars)
+        self.fail_first = int(fail_first)
+        self.fail_rate = fail_rate
+        self.fatal_rate = fatal_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.drop_delimiter = drop_delimiter
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec):
+        _, _, options = spec.partition(":")
+        kwargs = {}
+        for item in filter(None, options.split(",")):
+            key, _, value = item.partition("=")
+            kwargs[key.strip()] = float(value)
+        return cls(**kwargs)
+
+    def generate_content(self, contents, stream=False):
+        with self._lock:
+            self.calls += 1
+            call, roll, tail = self.calls, self._random.random(), self._random.random() < self.tail_rate
+        time.sleep(self.tail_latency if tail else self.latency)
+        if call <= self.fail_first or roll < self.fail_rate: raise ServiceUnavailable("503 The model is overloaded (injected).")
+        if roll < self.fail_rate + self.fatal_rate: raise InvalidArgument("400 Request rejected (injected).")
+        if stream: return self._stream(self._respond(contents))
+        return self._respond(contents)
+
+    def _stream(self, response):
+        for index, line in enumerate(response.text.splitlines(keepends=True)):
+            if index: time.sleep(self.chunk_delay)
+            yield FakeResponse(line, 0)
+
+    def _respond(self, contents):
+        from .packing import PACK_MARKER
+        prompt = next((c for c in contents if isinstance(c, str)), "")
+        images = [c for c in contents if not isinstance(c, str)]
+        if len(images) > 1 and PACK_MARKER.format(index="N") in prompt:
+            # A packed request: one delimited section per image, some delimiters dropped if asked to.
+            user_prompt = prompt.split("\n\n")[0]
+            with self._lock: dropped = [self._random.random() < self.drop_delimiter for _ in images]
+            lines = []
+            for index, image in enumerate(images, 1):
+                if not dropped[index - 1]: lines.append(PACK_MARKER.format(index=index))
+                lines += self._document(user_prompt, [(index, image)], self.chars // len(images))
+        else:
+            lines = self._document(prompt, list(enumerate(images, 1)), self.chars)
+        text = "\n".join(lines) + "\n"
+        return FakeResponse(text, total_token_count=258 * len(images) + len(text) // 4)
+
+    @staticmethod
+    def _document(prompt, images, chars):
+        lines = ["# Fake transcription", "", f"> {prompt}", ""]
+        for index, image in images:
+            if isinstance(image, dict): # Inline blob from `preprocess.optimize_image`
+                lines.append(f"- Image {index}: {len(image['data'])} bytes of {image['mime_type']}")
+            else:
+                lines.append(f"- Image {index}: {image.size[0]}x{image.size[1]}")
+        while sum(len(line) + 1 for line in lines) < chars:
+            lines += ["", f"## Section {len(lines)}", "", FILLER]
+        return lines
@@ -0,0 +1,167 @@
+"""
+Persistent history of transcriptions, searchable by full text.
+
+Every result is stored in a SQLite database in the cache directory together
+with its prompt, model, timestamps, response cache key and a small JPEG
+thumbnail. Search uses an FTS5 index when the SQLite build has it, and falls
+back to LIKE scans otherwise. A page of the listing reads only a snippet of
+each entry's Markdown; the full text is loaded when an entry is opened.
+"""
+import io
+import os
+import sqlite3
+import threading
+import time
+
+from .pipeline import CACHE_DIR
+
+HISTORY_DB = os.path.join(CACHE_DIR, "history.sqlite3")
+PAGE_SIZE = 50
+THUMBNAIL_SIZE = (96, 72)
+SNIPPET_CHARS = 160
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    captured_at REAL,
+    finished_at REAL NOT NULL,
+    seconds REAL,
+    prompt TEXT NOT NULL,
+    model TEXT NOT NULL,
+    source TEXT,
+    cache_key TEXT,
+    markdown TEXT NOT NULL,
+    thumbnail BLOB
+);
+CREATE INDEX IF NOT EXISTS entries_cache_key ON entries(cache_key);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(markdown, prompt, content='entries', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, markdown, prompt) VALUES (new.id, new.markdown, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, markdown, prompt) VALUES ('delete', old.id, old.markdown, old.prompt);
+END;
+"""
+
+LIST_COLUMNS = "e.id, e.captured_at, e.finished_at, e.seconds, e.prompt, e.model, e.source, e.cache_key, e.thumbnail"
+
+
+def encode_thumbnail(image, size=THUMBNAIL_SIZE, quality=70):
+    """A few KB of JPEG showing `image`, for the history list."""
+    from .thumbnails import make_thumbnail
+    thumbnail = make_thumbnail(image, size).convert("RGB")
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def fts_query(text):
+    """Turns what the user typed into an FTS5 query: every word, as a prefix, in any order."""
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def _like_pattern(word):
+    return "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class History:
+    """
+    The history database at `path`. The connection is opened on first use
+    and shared between threads behind a lock, so the GUI can query it from
+    worker threads.
+    """
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.fts = None # Whether the FTS5 index is available; known once connected
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            try:
+                had_index = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'").fetchone()
+                connection.executescript(FTS_SCHEMA)
+                # Entries written while FTS5 was unavailable are indexed once.
+                if not had_index: connection.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _execute(self, sql, parameters=()):
+        with self._lock:
+            connection = self._connect()
+            with connection: return connection.execute(sql, parameters).fetchall()
+
+    def add(self, markdown, prompt, model, image=None, source=None, cache_key=None, captured_at=None, seconds=None):
+        """Stores one result and returns its id. `image` is only used for the thumbnail."""
+        thumbnail = encode_thumbnail(image) if image is not None else None
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO entries (captured_at, finished_at, seconds, prompt, model, source, cache_key, markdown, thumbnail) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (captured_at, time.time(), seconds, prompt, model, source, cache_key, markdown, thumbnail))
+                return cursor.lastrowid
+
+    def _matching(self, query):
+        """SQL selecting the ids of entries matching `query`, newest first, and its parameters."""
+        words = query.split()
+        if not words: return "SELECT id FROM entries ORDER BY id DESC", []
+        if self.fts is None:
+            with self._lock: self._connect()
+        # FTS5 walks its index in rowid order, so paging never ranks or sorts all matches.
+        if self.fts: return "SELECT rowid FROM entries_fts WHERE entries_fts MATCH ? ORDER BY rowid DESC", [fts_query(query)]
+        clauses = " AND ".join("(markdown LIKE ? ESCAPE '\\' OR prompt LIKE ? ESCAPE '\\')" for _ in words)
+        return f"SELECT id FROM entries WHERE {clauses} ORDER BY id DESC", [p for word in words for p in (_like_pattern(word),) * 2]
+
+    def page(self, query="", offset=0, limit=PAGE_SIZE):
+        """
+        Newest first: dicts with the listing columns, the JPEG thumbnail and a
+        snippet of the Markdown around the first searched word.
+        """
+        matching, parameters = self._matching(query)
+        first_word = query.split()[0].lower() if query.split() else ""
+        snippet = f"substr(e.markdown, max(1, instr(lower(e.markdown), ?) - {SNIPPET_CHARS // 4}), {SNIPPET_CHARS})"
+        rows = self._execute(f"SELECT {LIST_COLUMNS}, {snippet} AS snippet FROM entries e "
+                             f"WHERE e.id IN ({matching} LIMIT ? OFFSET ?) ORDER BY e.id DESC",
+                             [first_word] + parameters + [limit, offset])
+        return [dict(row) for row in rows]
+
+    def count(self, query=""):
+        matching, parameters = self._matching(query)
+        return self._execute(f"SELECT count(*) FROM ({matching})", parameters)[0][0]
+
+    def get(self, entry_id):
+        """The full entry including its Markdown, or None."""
+        rows = self._execute("SELECT * FROM entries WHERE id = ?", (entry_id,))
+        return dict(rows[0]) if rows else None
+
+    def markdown_for_key(self, cache_key, since=None):
+        """
+        (markdown, finished_at) of the newest entry for a response cache key,
+        or None. `since` skips entries finished earlier.
+        """
+        if not cache_key: return None
+        rows = self._execute("SELECT markdown, finished_at FROM entries WHERE cache_key = ? AND finished_at >= ? ORDER BY id DESC LIMIT 1",
+                             (cache_key, since or 0))
+        return tuple(rows[0]) if rows else None
+
+    def delete(self, entry_id):
+        self._execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None: self._connection.close()
+            self._connection = None
@@ -0,0 +1,86 @@
+"""Per-stage latency measurements for the capture-to-result pipeline."""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .pipeline import CACHE_DIR
+
+TIMINGS_LOG = os.path.join(CACHE_DIR, "timings.jsonl")
+
+# Display order and short labels for the status bar.
+STAGE_LABELS = {
+    "screencapture": "capture",
+    "decode": "decode",
+    "hash": "hash",
+    "thumbnail": "thumbnail",
+    "queue_wait": "queued",
+    "cache_lookup": "cache",
+    "delta": "delta",
+    "preprocess": "preprocess",
+    "model_init": "model",
+    "first_token": "TTFT",
+    "generate_content": "generate",
+    "markdown": "markdown",
+    "set_html": "render",
+}
+
+
+class Timings:
+    """Seconds spent per named stage. Safe to update from several threads."""
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try: yield
+        finally: self.add(name, time.perf_counter() - started)
+
+    def merged(self, *others):
+        """A new Timings holding the stages of `self` followed by `others`."""
+        result = Timings()
+        for timings in (self,) + others:
+            for name, seconds in timings.stages.items(): result.add(name, seconds)
+        return result
+
+    def milliseconds(self):
+        with self._lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+
+    def summary(self):
+        ms = self.milliseconds()
+        names = [n for n in STAGE_LABELS if n in ms] + [n for n in ms if n not in STAGE_LABELS]
+        return " · ".join(f"{STAGE_LABELS.get(n, n)} {format_ms(ms[n])}" for n in names)
+
+
+def format_ms(ms):
+    return f"{ms / 1000:.2f}s" if ms >= 1000 else f"{ms:.0f}ms"
+
+
+class TimingLog:
+    """Appends one JSON record per processed job to `path`."""
+    def __init__(self, path=TIMINGS_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        line = json.dumps(dict(record, logged_at=time.time()), ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f: f.write(line)
+            except OSError: pass # Instrumentation must never break processing
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list, e.g. fraction=0.95."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
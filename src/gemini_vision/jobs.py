@@ -0,0 +1,259 @@
+"""
+Capture-to-Markdown jobs and the worker pool that runs them.
+
+Each capture becomes a `Job`. A `JobQueue` runs jobs on a bounded pool of
+threads, so a burst of captures is processed concurrently instead of one at
+a time behind the slowest API call. Nothing here touches Tk; the GUI listens
+for updates and marshals them onto the main thread itself.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import normalize_prompt
+from .delta import FULL, REGION, REUSE, DeltaDecision, region_prompt
+from .instrumentation import Timings, format_ms
+from .pipeline import make_model, stream_markdown
+from .tiling import should_tile, tiling_signature, transcribe_tiled
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+# Jobs listed by a `JobQueue`; older finished ones are dropped with their captures.
+MAX_JOBS = 100
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, capture, prompt, model_name, preprocess, api_key=None, tiling=False, use_delta=True, hedge_model=None):
+        self.id = next(self._ids)
+        self.capture = capture
+        self.prompt = prompt
+        self.model_name = model_name
+        self.preprocess = preprocess
+        self.api_key = api_key
+        self.tiling = tiling
+        self.use_delta = use_delta
+        self.hedge_model = hedge_model # Faster model raced against slow requests, if any
+        self.request_notes = "" # Retries and hedges, see `PolicyModel.describe`
+        self.tiles = None # (finished, total) while a tiled job runs
+        self.status = QUEUED
+        self.markdown = ""
+        self.error = None
+        self.cached = False
+        self.cache_key = None
+        self.delta = None # REUSE or REGION when the previous capture's result was built upon
+        self.upload_summary = ""
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.future = None
+        self.timings = Timings()
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def check_cancelled(self):
+        if self.cancelled: raise JobCancelled()
+
+    def summary(self):
+        """Timing and cache details for the status bar."""
+        if self.status == FAILED: return f"Job #{self.id} failed: {self.error}" + (f" ({self.request_notes})" if self.request_notes else "")
+        if self.status == CANCELLED: return f"Job #{self.id} was cancelled."
+        if self.status == QUEUED: return f"Job #{self.id} is waiting for a free worker."
+        if self.status == RUNNING:
+            if self.tiles: return f"Job #{self.id}: {self.tiles[0]} of {self.tiles[1]} tiles done..."
+            if self.first_token_at is None: return f"Job #{self.id}: calling {self.model_name.split('/')[-1]}..."
+            return f"Job #{self.id}: receiving... (first token after {self.first_token_at - self.started_at:.2f}s)"
+        stages = self.all_timings().summary()
+        if self.cached: return f"Job #{self.id}: cached result · {stages}"
+        if self.delta == REUSE: return f"Job #{self.id}: unchanged since the previous capture, result reused · {stages}"
+        if self.delta == REGION: stages = f"changed region only · {stages}"
+        text = f"Job #{self.id}: total {format_ms(1000 * (self.finished_at - self.started_at))} · {stages}"
+        details = ", ".join(filter(None, [self.request_notes, self.upload_summary]))
+        return text + (f" ({details})" if details else "")
+
+    def all_timings(self):
+        """Capture-side stages followed by this job's own."""
+        return self.capture.timings.merged(self.timings)
+
+    def timing_record(self):
+        """The structured record appended to the timings log."""
+        return {"job": self.id, "status": self.status, "model": self.model_name, "preprocess": self.preprocess.signature(),
+                "cached": self.cached, "delta": self.delta, "request_notes": self.request_notes, "image_bytes": len(self.capture.data), "output_chars": len(self.markdown),
+                "stages_ms": self.all_timings().milliseconds()}
+
+    def label(self):
+        prompt = self.prompt if len(self.prompt) <= 40 else self.prompt[:39] + "…"
+        status = self.status
+        if self.status == DONE and self.cached: status = "cached"
+        elif self.status == DONE and self.delta == REUSE: status = "reused"
+        return f"#{self.id:<3} {status:<9} {self.model_name.split('/')[-1]:<22} {prompt}"
+
+
+def run_job(job, cache=None, on_progress=None, delta=None, policy=None, models=make_model):
+    """
+    Runs one job to completion: response cache lookup, upload preparation and
+    a streaming request, or concurrent requests for the tiles of a tall
+    capture. With a `DeltaTracker`, a capture that barely differs from the
+    previous one reuses its result or sends only the changed region. With a
+    `RequestPolicy`, requests get a deadline, retries and optional hedging.
+    `models(api_key, model_name)` builds the model, e.g. a `ModelPool`.
+    `on_progress(job)` is called after every chunk or tile.
+    Raises JobCancelled if the job is cancelled meanwhile.
+    """
+    timings = job.timings
+    tiled = job.tiling and should_tile(job.capture.image.size)
+    variant = job.preprocess.signature() + (f"|{tiling_signature()}" if tiled else "")
+    if cache:
+        digest = job.capture.digest # Decode and hash are timed on the capture
+        with timings.stage("cache_lookup"):
+            key = job.cache_key = cache.make_key(job.capture.image, job.prompt, job.model_name, variant, digest=digest)
+            cached = cache.get(key)
+        if cached is not None:
+            job.markdown, job.cached = cached, True
+            return
+    context = (normalize_prompt(job.prompt), job.model_name, variant)
+    decision = DeltaDecision(FULL)
+    if delta and job.use_delta:
+        with timings.stage("delta"): decision = delta.decide(job.capture.image, context, allow_region=not tiled)
+    if decision.kind == REUSE:
+        # The baseline stays the capture the reused Markdown was made from.
+        job.markdown, job.delta = decision.previous_markdown, REUSE
+        delta.record_savings(len(job.capture.data))
+    else:
+        with timings.stage("model_init"): model = _make_model(job, policy, models)
+        try:
+            if tiled: _run_tiled(job, model, on_progress)
+            else: _run_streaming(job, model, on_progress, decision, delta)
+        finally:
+            if policy: job.request_notes = model.describe()
+        if delta: delta.remember(job.capture.image, context, job.markdown)
+    if cache: cache.put(key, job.markdown, model=job.model_name, prompt=job.prompt)
+
+
+def _make_model(job, policy, models):
+    model = models(job.api_key, job.model_name)
+    if policy is None: return model
+    hedge = models(job.api_key, job.hedge_model) if job.hedge_model else None
+    return policy.wrap(model, job.model_name, hedge, job.hedge_model, check=job.check_cancelled)
+
+
+def _run_streaming(job, model, on_progress, decision, delta):
+    timings = job.timings
+    prompt = job.prompt
+    with timings.stage("preprocess"):
+        if decision.kind == REGION:
+            from .preprocess import encode_for_upload
+            upload = encode_for_upload(job.capture.image.crop(decision.box), job.preprocess)
+            prompt, job.delta = region_prompt(job.prompt, decision.previous_markdown), REGION
+            delta.record_savings(len(job.capture.data), len(upload["data"]))
+        else:
+            upload, optimized = job.capture.upload_part(job.preprocess)
+            if optimized: job.upload_summary = optimized.summary()
+    job.check_cancelled()
+    parts = []
+    requested_at = time.perf_counter()
+    for text in stream_markdown(model, prompt, upload):
+        job.check_cancelled() # Abandoning the iterator closes the stream
+        if job.first_token_at is None:
+            job.first_token_at = time.perf_counter()
+            timings.add("first_token", job.first_token_at - requested_at)
+        parts.append(text)
+        job.markdown = "".join(parts)
+        if on_progress: on_progress(job)
+    timings.add("generate_content", time.perf_counter() - requested_at)
+
+
+def _run_tiled(job, model, on_progress):
+    requested_at = time.perf_counter()
+    def on_tile(done, count, partial):
+        if job.first_token_at is None:
+            job.first_token_at = time.perf_counter()
+            job.timings.add("first_token", job.first_token_at - requested_at)
+        job.tiles, job.markdown = (done, count), partial
+        if on_progress: on_progress(job)
+        job.check_cancelled()
+    job.markdown = transcribe_tiled(job.capture.image, job.prompt, model, job.preprocess, on_tile=on_tile)
+    job.timings.add("generate_content", time.perf_counter() - requested_at)
+
+
+class JobQueue:
+    """
+    Runs jobs on up to `workers` threads. `on_update(job)` is called from
+    worker threads whenever a job changes status, and `on_progress(job)` for
+    each streamed chunk. `jobs` lists the jobs in submission order; beyond
+    `max_jobs`, the oldest finished ones are dropped from its start and
+    counted in `dropped`.
+    """
+    def __init__(self, workers=3, cache=None, on_update=None, on_progress=None, delta=None, policy=None, models=make_model, max_jobs=MAX_JOBS):
+        self.cache = cache
+        self.delta = delta
+        self.policy = policy
+        self.models = models
+        self.on_update = on_update or (lambda job: None)
+        self.on_progress = on_progress
+        self.max_jobs = max_jobs
+        self.jobs = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-job")
+
+    def submit(self, job):
+        with self._lock:
+            self.jobs.append(job)
+            while len(self.jobs) > self.max_jobs and self.jobs[0].finished:
+                self.jobs.pop(0)
+                self.dropped += 1
+        job.future = self._executor.submit(self._run, job)
+        self.on_update(job)
+        return job
+
+    def _run(self, job):
+        if job.cancelled: # Cancelled after a worker picked it up, too late for `future.cancel()`
+            job.status, job.finished_at = CANCELLED, time.perf_counter()
+            self.on_update(job)
+            return
+        # The decoded image is kept until the last update (e.g. the history thumbnail) is done.
+        with job.capture.in_use():
+            job.status, job.started_at = RUNNING, time.perf_counter()
+            job.timings.add("queue_wait", job.started_at - job.submitted_at)
+            self.on_update(job)
+            try:
+                run_job(job, self.cache, self.on_progress, self.delta, self.policy, self.models)
+                job.status = DONE
+            except JobCancelled:
+                job.status = CANCELLED
+            except Exception as e:
+                job.status, job.error = FAILED, e
+            job.finished_at = time.perf_counter()
+            self.on_update(job)
+
+    def discard(self, job):
+        """Removes `job` from `jobs`, e.g. once its result has been delivered, so its capture can be freed."""
+        with self._lock:
+            if job in self.jobs: self.jobs.remove(job)
+
+    def cancel(self, job):
+        """Cancels a queued job outright, or stops a running one at its next chunk."""
+        if job.finished: return
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status, job.finished_at = CANCELLED, time.perf_counter()
+            self.on_update(job)
+
+    def shutdown(self):
+        with self._lock: jobs = list(self.jobs)
+        for job in jobs: job._cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,81 @@
+"""Discovery and on-disk caching of the vision models available to an API key."""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from .pipeline import CACHE_DIR
+
+CATALOGUE_FILE = os.path.join(CACHE_DIR, "models.json")
+# Older lists are not shown at startup; the app waits for a fresh fetch instead.
+CATALOGUE_MAX_AGE = 7 * 24 * 3600
+
+
+def sort_models(names):
+    """Orders models newest first, preferring "latest" aliases."""
+    def get_sort_key(name):
+        latest = 1 if 'latest' in name else 0
+        version = float(match.group(1)) if (match := re.search(r'(\d+\.\d+)', name)) else 0.0
+        return (-latest, -version, name)
+    return sorted(names, key=get_sort_key)
+
+
+def speed_tier(name):
+    """0 for the lightest models, 1 for flash, 2 for everything else."""
+    name = name.lower()
+    if 'lite' in name or '-8b' in name: return 0
+    return 1 if 'flash' in name else 2
+
+
+def pick_hedge_model(models, current):
+    """The newest model in `models` from a faster tier than `current`, or None."""
+    return next((m for m in sort_models(models) if speed_tier(m) < speed_tier(current)), None)
+
+
+def fetch_vision_models(api_key):
+    """Lists the models usable for screenshots, sorted. Raises if there are none."""
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    vision_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods and ('vision' in m.name or 'flash' in m.name)]
+    if not vision_models: raise Exception("No compatible vision models found.")
+    return sort_models(vision_models)
+
+
+class ModelCatalogue:
+    """
+    The last fetched model list per API key. Keys are stored only as a hash,
+    next to the time of the fetch.
+    """
+    def __init__(self, path=CATALOGUE_FILE, max_age=CATALOGUE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+    @staticmethod
+    def fingerprint(api_key):
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, api_key):
+        """Returns the cached model list for `api_key`, or None if missing or too old."""
+        entry = self._read().get(self.fingerprint(api_key))
+        if not entry or time.time() - entry.get("fetched_at", 0) > self.max_age: return None
+        return entry.get("models") or None
+
+    def save(self, api_key, models):
+        data = self._read()
+        data[self.fingerprint(api_key)] = {"models": models, "fetched_at": time.time()}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f: json.dump(data, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
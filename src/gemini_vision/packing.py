@@ -0,0 +1,118 @@
+"""
+Several images in one request.
+
+Every request pays a fixed cost in latency, quota and repeated prompt tokens.
+For high-volume runs, several images are sent together with the prompt once,
+and the model is asked to answer each under a numbered delimiter line. The
+answer is split back into one Markdown document per image. Images whose
+section is missing or ambiguous are sent again on their own.
+
+Packs are limited by image count, request size and the expected output
+length, since the combined answer has to fit in one response.
+"""
+import math
+import re
+
+# Gemini rejects requests with more inline data than about 20 MB.
+MAX_PACK_BYTES = 16 * 1024 * 1024
+MAX_PACK_IMAGES = 8
+# The combined answer must fit in one response.
+MAX_OUTPUT_TOKENS = 8192
+OUTPUT_TOKENS_PER_IMAGE = 1000
+
+PACK_MARKER = "<<<IMAGE {index}>>>"
+PACK_PROMPT = ("{prompt}\n\nYou are given {count} separate images. Answer the request above for each image on its own, "
+               "in order. Start the answer for image number N with a line containing only " + PACK_MARKER.format(index="N") +
+               ", e.g. " + PACK_MARKER.format(index=1) + " for the first image, and write nothing else on that line. "
+               "Do not refer to the other images.")
+
+# Errors a pack may cause by its size alone (too many bytes, images or tokens), after which its
+# images are sent one at a time. Matched by class name and message, like `policy.TRANSIENT_ERRORS`;
+# other errors (a bad key, permissions, the deadline) would fail the single requests just the same.
+PACK_SIZE_ERRORS = {"InvalidArgument", "OutOfRange", "RequestEntityTooLarge", "PayloadTooLarge"}
+_SIZE_HINT = re.compile(r"too large|too many|too long|exceed|limit|size|token", re.IGNORECASE)
+
+_DELIMITER = re.compile(r"^[ \t>*#`_]*<<<\s*IMAGE\s+(\d+)\s*>>>[ \t*`_]*$", re.IGNORECASE | re.MULTILINE)
+
+
+class PackBudget:
+    """Limits for one packed request."""
+    def __init__(self, max_images=MAX_PACK_IMAGES, max_bytes=MAX_PACK_BYTES, max_output_tokens=MAX_OUTPUT_TOKENS,
+                 output_tokens_per_image=OUTPUT_TOKENS_PER_IMAGE, max_input_tokens=None):
+        self.max_images = max_images
+        self.max_bytes = max_bytes
+        self.max_input_tokens = max_input_tokens # e.g. a tokens-per-minute limit
+        self.max_output_tokens = max_output_tokens
+        self.output_tokens_per_image = output_tokens_per_image
+
+    @property
+    def images_per_pack(self):
+        return max(1, min(self.max_images, self.max_output_tokens // self.output_tokens_per_image))
+
+
+def estimate_image_tokens(size):
+    """Input tokens Gemini bills for an image: 258 for small ones, else 258 per 768x768 tile."""
+    width, height = size
+    if width <= 384 and height <= 384: return 258
+    return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+
+
+def plan_packs(items, budget):
+    """
+    Groups consecutive items, given as (upload bytes, input tokens), into
+    packs within `budget`. Returns lists of indexes; an item too large for
+    any pack gets one of its own.
+    """
+    packs, current, used_bytes, used_tokens = [], [], 0, 0
+    for index, (size, tokens) in enumerate(items):
+        full = (len(current) >= budget.images_per_pack or used_bytes + size > budget.max_bytes
+                or (budget.max_input_tokens and used_tokens + tokens > budget.max_input_tokens))
+        if current and full:
+            packs.append(current)
+            current, used_bytes, used_tokens = [], 0, 0
+        current.append(index)
+        used_bytes += size
+        used_tokens += tokens
+    if current: packs.append(current)
+    return packs
+
+
+def is_pack_size_error(error):
+    return any(cls.__name__ in PACK_SIZE_ERRORS for cls in type(error).__mro__) and bool(_SIZE_HINT.search(str(error)))
+
+
+def pack_prompt(prompt, count):
+    return PACK_PROMPT.format(prompt=prompt, count=count)
+
+
+def split_response(text, count):
+    """
+    Splits a packed answer into {image number (1-based): Markdown}. Images
+    whose section is missing or empty are left out, and so is the section
+    before a missing delimiter, which may hold both answers. Numbers out of
+    order make the whole answer unusable and return {}.
+    """
+    matches = list(_DELIMITER.finditer(text))
+    numbers = [int(m.group(1)) for m in matches]
+    if numbers != sorted(set(numbers)) or any(not 1 <= n <= count for n in numbers): return {}
+    sections = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        body = text[match.end():following.start() if following else len(text)].strip("\n")
+        if body.strip(): sections[int(match.group(1))] = body + "\n"
+    for missing in set(range(1, count + 1)) - set(numbers):
+        sections.pop(max((n for n in numbers if n < missing), default=None), None)
+    return sections
+
+
+def generate_packed(model, prompt, parts):
+    """
+    Sends `parts` (upload blobs) with one request. Returns (the per-image
+    Markdown, or None for images to retry alone; the response).
+    """
+    from .pipeline import generate_markdown
+    if len(parts) == 1: # Nothing to split
+        response = generate_markdown(model, prompt, parts[0])
+        return [response.text], response
+    response = model.generate_content([pack_prompt(prompt, len(parts)), *parts])
+    sections = split_response(response.text, len(parts))
+    return [sections.get(number) for number in range(1, len(parts) + 1)], response
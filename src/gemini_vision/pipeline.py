@@ -0,0 +1,76 @@
+"""Tk-free pieces of the capture-to-Markdown pipeline.
+
+Everything here can be used from the GUI, the headless batch runner or a
+script, so nothing in this module may import tkinter.
+"""
+import os
+import threading
+
+# --- Shared Defaults ---
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gemini_vision_app")
+API_KEY_FILE = os.path.join(CACHE_DIR, "api_key.txt")
+DEFAULT_MODEL = "models/gemini-2.5-flash"
+DEFAULT_PROMPT = "Transcribe this screenshot into a Markdown document."
+
+
+def read_saved_api_key():
+    """Returns the API key saved by the GUI, or None."""
+    try:
+        with open(API_KEY_FILE, 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def make_model(api_key, model_name):
+    """
+    Builds a model object exposing `generate_content`.
+
+    Names starting with "fake" return a local `FakeModel` so the pipeline can be
+    exercised without network access (see `fake.FakeModel.from_spec`).
+    """
+    if model_name.startswith("fake"):
+        from .fake import FakeModel
+        return FakeModel.from_spec(model_name)
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
+
+class ModelPool:
+    """
+    Model objects kept for reuse, so a long-running process configures the
+    SDK once per key and keeps its client and connections warm. Calling the
+    pool is a drop-in replacement for `make_model`.
+    """
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, api_key, model_name):
+        with self._lock:
+            model = self._models.get((api_key, model_name))
+            if model is None: model = self._models[(api_key, model_name)] = make_model(api_key, model_name)
+            return model
+
+    def names(self):
+        with self._lock: return sorted({name for _, name in self._models})
+
+
+def generate_markdown(model, prompt, image):
+    """Sends one image and prompt to `model` and returns the response."""
+    return model.generate_content([prompt, image])
+
+
+def stream_markdown(model, prompt, image):
+    """Yields Markdown fragments as the model streams them."""
+    for chunk in model.generate_content([prompt, image], stream=True):
+        try: text = chunk.text
+        except ValueError: continue # Chunks carrying only metadata or a finish reason have no text
+        if text: yield text
+
+
+def response_token_count(response):
+    """Total tokens billed for `response`, or None when the backend does not say."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
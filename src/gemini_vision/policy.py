@@ -0,0 +1,191 @@
+"""
+Deadlines, retries and hedging around model requests.
+
+`RequestPolicy.wrap` returns an object with the same `generate_content`
+interface as a model, so the rest of the pipeline (streaming, tiles, batch)
+uses it unchanged. Each call:
+
+  * fails with `RequestTimeout` once the policy's deadline has passed, counting
+    retries and waits;
+  * retries transient errors (rate limits, 5xx, dropped connections) with
+    exponential backoff and jitter, as long as nothing has been returned yet;
+  * optionally hedges: when the first answer has not started within the usual
+    time for this model (a percentile of recent calls), the same request goes
+    to a faster model too. The first to answer wins and the other is abandoned.
+
+Requests run on daemon threads, so a request that does not answer in time is
+abandoned rather than blocking the caller.
+"""
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+from .instrumentation import percentile
+
+DEFAULT_DEADLINE = 180.0
+DEFAULT_RETRIES = 3
+# Exception class names (anywhere in the class hierarchy) treated as transient.
+# Names are used so google.api_core does not have to be imported to check.
+TRANSIENT_ERRORS = {"ServiceUnavailable", "TooManyRequests", "ResourceExhausted", "InternalServerError", "BadGateway",
+                    "GatewayTimeout", "DeadlineExceeded", "TimeoutError", "ConnectionError", "RemoteDisconnected"}
+# How often a waiting call checks for cancellation.
+POLL_INTERVAL = 0.1
+
+
+class RequestTimeout(Exception):
+    pass
+
+
+def is_transient(error):
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class RequestPolicy:
+    """
+    Shared settings plus the recent time to first answer per model, which sets
+    when to hedge. `hedge_after` seconds is used until a model has
+    `min_samples` measurements.
+    """
+    def __init__(self, deadline=DEFAULT_DEADLINE, retries=DEFAULT_RETRIES, backoff=0.5, max_backoff=8.0,
+                 hedge_percentile=0.9, hedge_after=5.0, min_samples=10, history=100):
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.min_samples = min_samples
+        self._latencies = {} # (model name, stream) -> recent seconds to first answer
+        self._history = history
+        self._lock = threading.Lock()
+
+    def record_latency(self, key, seconds):
+        with self._lock:
+            self._latencies.setdefault(key, deque(maxlen=self._history)).append(seconds)
+
+    def hedge_delay(self, key):
+        with self._lock: samples = list(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples: return self.hedge_after
+        return percentile(samples, self.hedge_percentile)
+
+    def backoff_delay(self, retry):
+        """Exponential backoff with "equal jitter": half fixed, half random."""
+        delay = min(self.max_backoff, self.backoff * 2 ** retry)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def wrap(self, model, name, hedge=None, hedge_name=None, check=None):
+        """
+        `model` behind this policy. `hedge` is the faster model to race against
+        it, if any; `check()` is called while waiting and may raise to abandon
+        the request (e.g. when its job is cancelled).
+        """
+        return PolicyModel(self, model, name, hedge, hedge_name, check)
+
+
+class _Attempt(threading.Thread):
+    """One request to one model, reporting chunks, completion or failure to `events`."""
+    def __init__(self, model, name, contents, stream, events):
+        super().__init__(daemon=True, name=f"gemini-request-{name.split('/')[-1]}")
+        self.model = model
+        self.model_name = name
+        self.contents = contents
+        self.stream = stream
+        self.events = events
+        self.started = time.monotonic()
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            result = self.model.generate_content(self.contents, stream=self.stream)
+            for chunk in (result if self.stream else [result]):
+                if self.stopped.is_set(): return # Dropping the iterator closes the stream
+                self.events.put((self, "chunk", chunk))
+            self.events.put((self, "done", None))
+        except Exception as e:
+            self.events.put((self, "error", e))
+
+
+class PolicyModel:
+    """A model with deadlines, retries and hedging applied to every call. Safe to share between threads."""
+    def __init__(self, policy, model, name, hedge=None, hedge_name=None, check=None):
+        self.policy = policy
+        self.model = model
+        self.name = name
+        self.hedge = hedge
+        self.hedge_name = hedge_name
+        self.check = check
+        self.calls = self.retries = self.hedges = self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items(): setattr(self, name, getattr(self, name) + value)
+
+    def generate_content(self, contents, stream=False):
+        chunks = self._chunks(contents, stream)
+        if stream: return chunks
+        with closing(chunks): return next(chunks)
+
+    def _chunks(self, contents, stream):
+        policy = self.policy
+        self._count(calls=1)
+        started = time.monotonic()
+        deadline = started + policy.deadline
+        events = queue.Queue()
+        running, winner, retry = [], None, 0
+        retry_at = None
+        hedge_at = started + policy.hedge_delay((self.name, stream)) if self.hedge is not None else None
+
+        def launch(model, name):
+            attempt = _Attempt(model, name, contents, stream, events)
+            running.append(attempt)
+            attempt.start()
+
+        launch(self.model, self.name)
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline: raise RequestTimeout(f"No answer from {self.name.split('/')[-1]} within {policy.deadline:.0f}s.")
+                if self.check: self.check()
+                if retry_at is not None and now >= retry_at:
+                    launch(self.model, self.name)
+                    retry_at = None
+                if hedge_at is not None and winner is None and now >= hedge_at:
+                    launch(self.hedge, self.hedge_name)
+                    hedge_at = None
+                    self._count(hedges=1)
+                wait = min(t for t in (deadline, retry_at, hedge_at) if t is not None) - now
+                try: attempt, kind, value = events.get(timeout=max(0.0, min(wait, POLL_INTERVAL) if self.check else wait))
+                except queue.Empty: continue
+                if winner is not None and attempt is not winner: continue # Late output of an abandoned attempt
+                if kind == "error":
+                    running.remove(attempt)
+                    if winner is not None: raise value # Part of the answer was already returned
+                    if running or retry_at is not None: continue # The other attempt may still succeed
+                    if not is_transient(value) or retry >= policy.retries: raise value
+                    retry_at = time.monotonic() + policy.backoff_delay(retry)
+                    if retry_at >= deadline: raise value
+                    retry += 1
+                    self._count(retries=1)
+                    continue
+                if winner is None:
+                    winner = attempt
+                    policy.record_latency((attempt.model_name, stream), time.monotonic() - attempt.started)
+                    if attempt.model is not self.model: self._count(hedge_wins=1)
+                    for other in running:
+                        if other is not winner: other.stopped.set()
+                    hedge_at = retry_at = None
+                if kind == "done": return
+                yield value
+        finally:
+            for attempt in running: attempt.stopped.set()
+
+    def describe(self):
+        """Retries and hedges so far, for the status bar; empty if there were none."""
+        notes = []
+        if self.retries: notes.append(f"{self.retries} retr{'y' if self.retries == 1 else 'ies'}")
+        if self.hedges: notes.append(f"hedged to {self.hedge_name.split('/')[-1]} {self.hedges}x, won {self.hedge_wins}")
+        return ", ".join(notes)
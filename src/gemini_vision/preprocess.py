@@ -0,0 +1,165 @@
+"""
+Upload-side image optimization.
+
+Screenshots from Retina displays are large PNGs, and uploading them dominates
+request latency. `optimize_image` downsizes, trims uniform borders, optionally
+drops color and re-encodes the image before it is sent to Gemini.
+
+Run this module directly to benchmark settings on your own screenshots:
+
+    python -m gemini_vision.preprocess shot1.png shot2.png -s format=jpeg,quality=60 -s text
+    python -m gemini_vision.preprocess shot.png --model models/gemini-2.5-flash
+
+With --model, each setting's transcription is compared with the transcription
+of the untouched image, so the quality cost of each setting is visible.
+"""
+import argparse
+import difflib
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageChops
+
+# Gemini scales larger images down to fit 3072x3072, so sending more is wasted upload.
+MODEL_MAX_SIDE = 3072
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class PreprocessOptions:
+    """Settings for `optimize_image`. `format=None` leaves the image untouched."""
+    def __init__(self, format="JPEG", quality=85, max_side=MODEL_MAX_SIDE, trim_borders=True, grayscale=False, border_tolerance=8):
+        self.format = format.upper() if format else None
+        self.quality = int(quality)
+        self.max_side = int(max_side)
+        self.trim_borders = bool(trim_borders)
+        self.grayscale = bool(grayscale)
+        self.border_tolerance = int(border_tolerance)
+        if self.format and self.format not in MIME_TYPES:
+            raise ValueError(f"Unsupported format {format!r}; choose from {', '.join(MIME_TYPES)}.")
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Parses a preset name or "key=value,..." pairs, e.g. "format=webp,quality=70,grayscale=1"."""
+        if spec in PRESETS: return PRESETS[spec]
+        kwargs = {}
+        for item in filter(None, spec.split(",")):
+            key, _, value = item.partition("=")
+            key, value = key.strip(), value.strip()
+            kwargs[key] = value if key == "format" else (value.lower() in ("1", "true", "yes") if key in ("trim_borders", "grayscale") else int(value))
+        return cls(**kwargs)
+
+    def signature(self):
+        """Stable description of the settings, used in response cache keys."""
+        if not self.format: return "original"
+        # The tolerance only changes the upload when borders are trimmed.
+        trim = f"trim1:tol{self.border_tolerance}" if self.trim_borders else "trim0"
+        return f"{self.format.lower()}:q{self.quality}:{self.max_side}px:{trim}:gray{int(self.grayscale)}"
+
+
+PRESETS = {
+    "original": PreprocessOptions(format=None),
+    "balanced": PreprocessOptions(),
+    "small": PreprocessOptions(format="WEBP", quality=70, max_side=2048),
+    "text": PreprocessOptions(format="JPEG", quality=75, max_side=2048, grayscale=True),
+}
+
+
+class OptimizedImage:
+    def __init__(self, data, mime_type, size, original_bytes, seconds):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+        self.original_bytes = original_bytes
+        self.seconds = seconds
+
+    @property
+    def bytes_saved(self):
+        return max(self.original_bytes - len(self.data), 0) if self.original_bytes else 0
+
+    def as_blob(self):
+        """The inline-data dict accepted by `generate_content`."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    def summary(self):
+        text = f"upload {len(self.data) / 1024:.0f} KB"
+        if self.original_bytes:
+            text += f", saved {self.bytes_saved / 1024:.0f} KB ({100 * self.bytes_saved / self.original_bytes:.0f}%)"
+        return text
+
+
+def trim_uniform_border(image, tolerance=8):
+    """Crops away a border whose color matches the top-left pixel."""
+    rgb = image.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    mask = ImageChops.difference(rgb, background).convert("L").point(lambda p: 255 if p > tolerance else 0)
+    bbox = mask.getbbox()
+    if not bbox or bbox == (0, 0) + image.size: return image
+    return image.crop(bbox)
+
+
+def optimize_image(image, options, original_bytes=None):
+    """Applies `options` to a PIL image and returns the encoded result as an `OptimizedImage`."""
+    started = time.perf_counter()
+    if options.trim_borders: image = trim_uniform_border(image, options.border_tolerance)
+    if max(image.size) > options.max_side:
+        image = image.copy()
+        image.thumbnail((options.max_side, options.max_side), Image.Resampling.LANCZOS)
+    if options.grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        # JPEG has no alpha channel; flatten transparent screenshots onto white.
+        flattened = Image.new("RGB", image.size, "white")
+        flattened.paste(image, mask=image.convert("RGBA").getchannel("A"))
+        image = flattened
+    buffer = io.BytesIO()
+    save_args = {"optimize": True} if options.format == "PNG" else {"quality": options.quality}
+    image.save(buffer, format=options.format, **save_args)
+    return OptimizedImage(buffer.getvalue(), MIME_TYPES[options.format], image.size, original_bytes, time.perf_counter() - started)
+
+
+def encode_for_upload(image, options):
+    """The upload part for a derived image such as a crop: preprocessed, or lossless PNG when preprocessing is off."""
+    if options.format: return optimize_image(image, options).as_blob()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return {"mime_type": "image/png", "data": buffer.getvalue()}
+
+
+# --- Benchmark ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gemini_vision.preprocess", description="Compare upload size and transcription quality across preprocessing settings.")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("-s", "--setting", action="append", help=f"Preset ({', '.join(PRESETS)}) or key=value list. Repeatable; defaults to all presets.")
+    parser.add_argument("-m", "--model", help="Also transcribe with this model and score each setting against the original image.")
+    parser.add_argument("-p", "--prompt")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    args = parser.parse_args(argv)
+
+    from .pipeline import DEFAULT_PROMPT, generate_markdown, make_model, read_saved_api_key
+    prompt = args.prompt or DEFAULT_PROMPT
+    model = make_model(args.api_key or read_saved_api_key(), args.model) if args.model else None
+    settings = args.setting or [name for name in PRESETS if name != "original"]
+
+    print(f"{'image':<24} {'setting':<32} {'size':>11} {'bytes':>10} {'saved':>6} {'ms':>6}" + (f" {'similarity':>10}" if model else ""))
+    for path in args.images:
+        with open(path, 'rb') as f: data = f.read()
+        original_bytes = len(data)
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            reference = generate_markdown(model, prompt, img).text if model else None
+            for spec in settings:
+                options = PreprocessOptions.from_spec(spec)
+                if options.format: optimized = optimize_image(img, options, original_bytes)
+                else: optimized = OptimizedImage(data, Image.MIME.get(img.format, "image/png"), img.size, original_bytes, 0.0) # Sent as captured
+                row = f"{os.path.basename(path)[:24]:<24} {options.signature()[:32]:<32} {'%dx%d' % optimized.size:>11} {len(optimized.data):>10} {100 * optimized.bytes_saved / original_bytes:>5.0f}% {1000 * optimized.seconds:>6.0f}"
+                if model:
+                    text = generate_markdown(model, prompt, optimized.as_blob()).text
+                    row += f" {difflib.SequenceMatcher(None, reference, text).ratio():>10.3f}"
+                print(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Preview thumbnails, built off the Tk main thread and cached per image and size."""
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# Pane widths are rounded to this many pixels, so small resizes reuse the cached thumbnail.
+WIDTH_STEP = 50
+
+
+def make_thumbnail(img, max_size):
+    """
+    Shrinks a decoded image to fit `max_size` without modifying it.
+
+    The image is first shrunk by an integer factor with `reduce()`, so the
+    final LANCZOS pass only has to work on a small image.
+    """
+    if img.mode in ("1", "P"): img = img.convert("RGBA")
+    factor = min(img.width // max_size[0], img.height // max_size[1])
+    img = img.reduce(factor) if factor >= 2 else img.copy()
+    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return img
+
+
+class ThumbnailCache:
+    """Small in-memory LRU of thumbnails keyed by (image digest, width, height)."""
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def size_for(pane_width, max_height=450):
+        width = pane_width if pane_width > 1 else 550
+        return (max(WIDTH_STEP, width - width % WIDTH_STEP), max_height)
+
+    def get(self, capture, max_size):
+        """Returns the thumbnail of a `Capture`, building it if needed. Safe to call from worker threads."""
+        key = (capture.data_digest, max_size)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        thumbnail = make_thumbnail(capture.image, max_size)
+        with self._lock:
+            self._entries[key] = thumbnail
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        return thumbnail
@@ -0,0 +1,112 @@
+"""
+Tiled processing of very tall captures.
+
+A full-page screenshot sent in one piece is shrunk by the model until the text
+is unreadable, and is slow to answer. Instead it is cut into overlapping
+horizontal strips which are transcribed concurrently. The per-strip Markdown
+is stitched back together in order, dropping lines repeated in the overlap.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+# Strips are about this many times as tall as they are wide.
+TILE_ASPECT = 1.3
+# Fraction of a strip repeated at the top of the next one, so no line is cut in half.
+TILE_OVERLAP = 0.08
+MAX_TILE_WORKERS = 4
+# How many lines at a strip boundary are compared when removing duplicates.
+STITCH_WINDOW = 40
+# A single repeated line only counts as overlap when it is at least this long.
+STITCH_DISTINCT_CHARS = 30
+
+TILE_PROMPT = ("\n\nThis image is part {index} of {count} of one tall screenshot, split top to bottom with a small "
+               "overlap. Transcribe only this part and start directly with its content, without a preamble.")
+
+
+def plan_tiles(size, aspect=TILE_ASPECT, overlap=TILE_OVERLAP):
+    """Returns crop boxes for overlapping strips, or a single box if the image is not tall enough to split."""
+    width, height = size
+    tile_height = max(256, round(width * aspect))
+    if height <= tile_height * 1.5: return [(0, 0, width, height)]
+    step = round(tile_height * (1 - overlap))
+    count = -(-(height - tile_height) // step) + 1
+    step = -(-(height - tile_height) // (count - 1)) # Spread the slack evenly
+    return [(0, min(i * step, height - tile_height), width, min(i * step, height - tile_height) + tile_height) for i in range(count)]
+
+
+def should_tile(size):
+    return len(plan_tiles(size)) > 1
+
+
+def tiling_signature():
+    """Part of the response cache key when tiling is enabled."""
+    return f"tiles:{TILE_ASPECT}:{TILE_OVERLAP}"
+
+
+def _normalize(line):
+    return " ".join(line.split()).lower()
+
+
+def _is_structural(line):
+    """Code fences, rules and table separators: repeated everywhere, so never evidence of overlap."""
+    return line.startswith(("```", "~~~")) or not line.strip("-*_|:= ")
+
+
+def _is_overlap(lines):
+    """Whether a run of normalized lines is distinctive enough to be a repeated strip boundary."""
+    content = [l for l in lines if not _is_structural(l)]
+    return len(content) >= 2 or (len(content) == 1 and len(content[0]) >= STITCH_DISTINCT_CHARS)
+
+
+def stitch(parts):
+    """
+    Joins per-strip Markdown in order, removing lines repeated across each
+    boundary. A repeat only counts when it holds two content lines or one long
+    one, so short lines such as code fences are never taken for overlap.
+    """
+    lines = []
+    for part in parts:
+        new = part.strip("\n").splitlines()
+        tail = [_normalize(l) for l in lines[-STITCH_WINDOW:] if l.strip()]
+        head_indexes = [i for i, l in enumerate(new[:STITCH_WINDOW]) if l.strip()]
+        head = [_normalize(new[i]) for i in head_indexes]
+        # Longest run of leading lines of the new strip that ends the text so far.
+        overlap = next((k for k in range(min(len(tail), len(head)), 0, -1) if head[:k] == tail[-k:] and _is_overlap(head[:k])), 0)
+        if not overlap:
+            # The two transcriptions of the overlap may differ slightly; drop leading lines seen just before.
+            seen = set(tail)
+            while overlap < len(head) and head[overlap] in seen and not _is_structural(head[overlap]): overlap += 1
+            if not _is_overlap(head[:overlap]): overlap = 0
+        if overlap: new = new[head_indexes[overlap - 1] + 1:] # Keeps the strip's own spacing after the cut
+        elif lines and new: lines.append("")
+        lines.extend(new)
+    return "\n".join(lines).strip("\n") + "\n"
+
+
+def transcribe_tiled(image, prompt, model, preprocess, workers=MAX_TILE_WORKERS, acquire=None, on_tile=None):
+    """
+    Transcribes `image` strip by strip with up to `workers` concurrent
+    requests. `acquire()` is called before each request (e.g. a rate limiter),
+    and `on_tile(done, count, partial)` after each strip with the Markdown of
+    all strips finished in order so far.
+    """
+    from .pipeline import generate_markdown
+    from .preprocess import encode_for_upload
+    boxes = plan_tiles(image.size)
+    results = [None] * len(boxes)
+
+    def run(index):
+        part = encode_for_upload(image.crop(boxes[index]), preprocess)
+        if acquire: acquire()
+        return index, generate_markdown(model, prompt + TILE_PROMPT.format(index=index + 1, count=len(boxes)), part).text
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(boxes))) as pool:
+        futures = [pool.submit(run, i) for i in range(len(boxes))]
+        try:
+            for done, future in enumerate(futures, 1):
+                index, text = future.result()
+                results[index] = text
+                if on_tile: on_tile(done, len(boxes), stitch(results[:index + 1]))
+        except BaseException:
+            for future in futures: future.cancel() # Do not start the remaining tiles
+            raise
+    return stitch(results)
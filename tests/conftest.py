@@ -0,0 +1,46 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+
+@pytest.fixture
+def make_images(tmp_path):
+    """Writes `count` small, distinct PNG screenshots under `tmp_path/<directory>` and returns their paths."""
+    def make(count, directory="shots", size=(320, 200)):
+        folder = tmp_path / directory
+        folder.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for index in range(count):
+            image = Image.new("RGB", size, "white")
+            ImageDraw.Draw(image).text((10, 10), f"{directory} screenshot {index}", fill="black")
+            path = folder / f"shot{index:02}.png"
+            image.save(path)
+            paths.append(str(path))
+        return paths
+    return make
+
+
+@pytest.fixture
+def make_capture():
+    """Returns a factory for in-memory PNG captures showing `label`, with optional black `dots`."""
+    from gemini_vision.capture import Capture
+    def make(label="screenshot", dots=()):
+        image = Image.new("RGB", (640, 400), "white")
+        draw = ImageDraw.Draw(image)
+        draw.text((20, 20), label, fill="black")
+        for dot in dots: draw.point(dot, fill="black")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return Capture(buffer.getvalue())
+    return make
+
+
+@pytest.fixture
+def make_job():
+    """Returns a factory for transcription jobs on a capture, with the fake backend by default."""
+    from gemini_vision.jobs import Job
+    from gemini_vision.preprocess import PRESETS
+    def make(capture, model="fake"):
+        return Job(capture, "Transcribe", model, PRESETS["original"])
+    return make
@@ -0,0 +1,110 @@
+import json
+import os
+
+from PIL import Image
+
+from gemini_vision.batch import JsonlSink, MarkdownDirSink, RateLimiter, iter_inputs, run_batch
+from gemini_vision.fake import FakeModel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_limiter_waits_for_the_request_window():
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=2, clock=clock, sleep=clock.sleep)
+    limiter.acquire()
+    clock.now = 10
+    limiter.acquire()
+    assert not clock.sleeps
+    limiter.acquire() # Waits until the first request leaves the window
+    assert clock.now == 60
+    limiter.acquire()
+    assert clock.now == 70
+
+
+def test_rate_limiter_counts_tokens():
+    clock = FakeClock()
+    limiter = RateLimiter(tokens_per_minute=1000, clock=clock, sleep=clock.sleep)
+    limiter.acquire(600)
+    limiter.acquire(400)
+    assert clock.now == 0
+    limiter.acquire(100)
+    assert clock.now == 60
+
+
+def test_rate_limiter_settles_estimates():
+    clock = FakeClock()
+    limiter = RateLimiter(tokens_per_minute=1000, clock=clock, sleep=clock.sleep)
+    slot = limiter.acquire(900)
+    limiter.settle(slot, 100) # Far fewer tokens were used than estimated
+    limiter.acquire(800)
+    assert clock.now == 0
+
+
+def test_rate_limiter_lets_an_oversized_request_through_alone():
+    clock = FakeClock()
+    limiter = RateLimiter(tokens_per_minute=100, clock=clock, sleep=clock.sleep)
+    limiter.acquire(500)
+    assert clock.now == 0
+    limiter.acquire(10)
+    assert clock.now == 60
+
+
+def test_iter_inputs_expands_directories_and_globs(make_images, tmp_path):
+    shots = make_images(2)
+    (tmp_path / "shots" / "notes.txt").write_text("not an image")
+    assert iter_inputs([str(tmp_path / "shots"), str(tmp_path / "shots" / "*.png")]) == shots
+
+
+def test_markdown_batch_resumes(make_images, tmp_path):
+    paths = make_images(4)
+    output = str(tmp_path / "out")
+    os.makedirs(output)
+    model = FakeModel()
+    assert run_batch(paths[:2], MarkdownDirSink(output, paths[:2]), model, "Transcribe", log=lambda msg: None) == (2, 0, 0)
+    assert run_batch(paths, MarkdownDirSink(output, paths), model, "Transcribe", log=lambda msg: None) == (2, 2, 0)
+    assert model.calls == 4
+    assert sorted(os.listdir(output)) == [".gemini-vision-root", "shot00.png.md", "shot01.png.md", "shot02.png.md", "shot03.png.md"]
+
+
+def test_markdown_targets_stay_put_when_inputs_change(make_images, tmp_path):
+    first, second = make_images(1, "a"), make_images(1, "b")
+    output = str(tmp_path / "out")
+    before = MarkdownDirSink(output, first)._target(first[0])
+    after = MarkdownDirSink(output, first + second)
+    assert after._target(first[0]) == before == os.path.join(output, "shot00.png.md")
+    assert after._target(second[0]) == os.path.join(output, "_abs", second[0].lstrip(os.sep) + ".md")
+
+
+def test_markdown_targets_keep_the_image_extension(make_images, tmp_path):
+    png = make_images(1)[0]
+    jpg = png[:-len(".png")] + ".jpg"
+    Image.open(png).save(jpg)
+    output = str(tmp_path / "out")
+    assert run_batch([png, jpg], MarkdownDirSink(output, [png, jpg]), FakeModel(), "Transcribe", log=lambda msg: None) == (2, 0, 0)
+    assert sorted(os.listdir(output)) == [".gemini-vision-root", "shot00.jpg.md", "shot00.png.md"]
+    assert run_batch([png, jpg], MarkdownDirSink(output, [png, jpg]), FakeModel(), "Transcribe", log=lambda msg: None) == (0, 2, 0)
+
+
+def test_jsonl_batch_resumes_and_retries_failures(make_images, tmp_path):
+    paths = make_images(3)
+    output = str(tmp_path / "results.jsonl")
+    sink = JsonlSink(output)
+    assert run_batch(paths, sink, FakeModel(fatal_rate=1.0), "Transcribe", log=lambda msg: None) == (0, 0, 3)
+    sink.close()
+    sink = JsonlSink(output)
+    assert run_batch(paths, sink, FakeModel(), "Transcribe", log=lambda msg: None) == (3, 0, 0)
+    sink.close()
+    with open(output) as f: records = [json.loads(line) for line in f]
+    assert sorted(record["path"] for record in records) == paths
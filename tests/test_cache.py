@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+from PIL import Image
+
+from gemini_vision.cache import ResponseCache
+
+
+def test_keys_depend_on_pixels_prompt_model_and_variant():
+    image = Image.new("RGB", (20, 10), "white")
+    key = ResponseCache.make_key(image, "Transcribe  this", "m")
+    assert key == ResponseCache.make_key(image.copy(), " Transcribe this ", "m") # Whitespace is normalized
+    assert key != ResponseCache.make_key(Image.new("RGB", (20, 10), "black"), "Transcribe this", "m")
+    assert key != ResponseCache.make_key(image, "Transcribe this", "other")
+    assert key != ResponseCache.make_key(image, "Transcribe this", "m", "jpeg:q85")
+
+
+def test_put_and_get(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, "# Result", model="m")
+    assert cache.get("ab" * 32) == "# Result"
+    assert cache.summary() == "cache 1/2 hits"
+
+
+def test_expired_entries_are_removed(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put("ab" * 32, "# Old")
+    path = cache._path("ab" * 32)
+    cache.ttl = 0.01
+    time.sleep(0.05)
+    assert cache.get("ab" * 32) is None
+    assert not os.path.exists(path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=2500) # Room for four entries
+    keys = [f"{i:02}" * 32 for i in range(6)]
+    for index, key in enumerate(keys[:3]):
+        cache.put(key, "x" * 500)
+        os.utime(cache._path(key), (1000 + index, 1000 + index))
+    assert cache.get(keys[0]) == "x" * 500 # Now the most recently used
+    for key in keys[3:]: cache.put(key, "x" * 500)
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+    assert sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(tmp_path) for f in files) <= 2500
+
+
+def test_fallback_fills_the_cache(tmp_path):
+    calls = []
+    cache = ResponseCache(str(tmp_path), fallback=lambda key, since: calls.append(key) or ("# From history", time.time()))
+    assert cache.get("cd" * 32) == "# From history"
+    assert cache.get("cd" * 32) == "# From history"
+    assert calls == ["cd" * 32]
+
+
+def test_expired_entries_do_not_fall_back(tmp_path):
+    finished_at = time.time() - 50 # When the history entry was stored
+    calls = []
+    def fallback(key, since):
+        calls.append(since)
+        return ("# From history", finished_at) if finished_at >= since else None
+    cache = ResponseCache(str(tmp_path), ttl=60, fallback=fallback)
+    cache.put("ab" * 32, "# Old", created_at=time.time() - 120)
+    assert cache.get("ab" * 32) is None and calls == []
+    assert cache.get("ab" * 32) == "# From history" # Missing now, and the history entry is within the TTL
+    with open(cache._path("ab" * 32), encoding="utf-8") as f: assert json.load(f)["created_at"] == finished_at
+    cache.ttl = 40 # The restored entry expires at the history entry's original time
+    assert cache.get("ab" * 32) is None and len(calls) == 1
+    assert cache.get("ab" * 32) is None and len(calls) == 2
+
+
+def test_a_full_cache_is_not_rescanned_on_every_write(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=20_000)
+    scans = []
+    entries = cache._entries
+    cache._entries = lambda: scans.append(1) or entries()
+    for index in range(400): cache.put(f"{index:04}" * 16, "x" * 500)
+    assert len(scans) < 400 // 5 # Each scan frees room for several writes
+    assert cache._size == sum(size for _, size, _ in entries()) <= 20_000
+
+
+def test_overwriting_an_entry_does_not_grow_the_size(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put("ab" * 32, "x" * 500)
+    cache._size = os.path.getsize(cache._path("ab" * 32))
+    for _ in range(5): cache.put("ab" * 32, "x" * 500)
+    assert cache._size == os.path.getsize(cache._path("ab" * 32))
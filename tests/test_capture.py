@@ -0,0 +1,69 @@
+import io
+import sys
+
+import pytest
+from PIL import Image
+
+from gemini_vision.cache import image_digest
+from gemini_vision.capture import CommandBackend, FileBackend, StdinBackend, get_backend
+from gemini_vision.preprocess import PRESETS
+
+
+def test_the_image_is_decoded_once_and_shared(make_capture, monkeypatch):
+    shot = make_capture()
+    opened = []
+    open_image = Image.open
+    monkeypatch.setattr(Image, "open", lambda *args: opened.append(args) or open_image(*args))
+    assert shot.image is shot.image and len(opened) == 1
+    assert shot.digest == image_digest(shot.image)
+    assert shot.mime_type == "image/png"
+
+
+def test_original_uploads_send_the_captured_bytes(make_capture):
+    shot = make_capture()
+    part, optimized = shot.upload_part(PRESETS["original"])
+    assert part == {"mime_type": "image/png", "data": shot.data} and optimized is None
+    part, optimized = shot.upload_part(PRESETS["small"])
+    assert part["mime_type"] == "image/webp" and optimized is not None
+
+
+def test_release_drops_the_decoded_image(make_capture):
+    shot = make_capture()
+    shot.image
+    shot.release()
+    assert shot._image is None
+    assert shot.image.size == (640, 400) # Still readable, but decoded again and not kept
+    assert shot._image is None
+
+
+def test_release_while_in_use_waits_for_the_job(make_capture):
+    shot = make_capture()
+    with shot.in_use():
+        image = shot.image
+        shot.release()
+        assert shot.image is image
+    assert shot._image is None
+
+
+def test_file_command_and_stdin_backends(make_capture, tmp_path, monkeypatch):
+    data = make_capture().data
+    path = tmp_path / "shot.png"
+    path.write_bytes(data)
+    shot = FileBackend(str(path)).capture()
+    assert (shot.data, shot.source) == (data, str(path))
+    assert CommandBackend(f"cat {path}").capture().data == data
+    assert CommandBackend("true").capture() is None
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(data)))
+    assert StdinBackend().capture().data == data
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(b"")))
+    assert StdinBackend().capture() is None
+
+
+def test_get_backend_parses_specs(monkeypatch):
+    assert isinstance(get_backend("file:/tmp/x.png"), FileBackend)
+    assert get_backend("command:import -window root png:-").command == "import -window root png:-"
+    assert isinstance(get_backend("stdin"), StdinBackend)
+    monkeypatch.setenv("GEMINI_VISION_CAPTURE", "stdin")
+    assert isinstance(get_backend(), StdinBackend)
+    for spec in ("file:", "bogus"):
+        with pytest.raises(ValueError): get_backend(spec)
@@ -0,0 +1,61 @@
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from gemini_vision.client import DaemonClient, DaemonModel, daemon_or_local
+from gemini_vision.daemon import DaemonServer, DaemonService
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = DaemonServer(str(tmp_path / "daemon.sock"), DaemonService("key-a", workers=2))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.service.job_queue.shutdown()
+
+
+@pytest.fixture
+def daemon(server):
+    return DaemonClient(server.server_address)
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_transcribe(daemon):
+    result = daemon.transcribe(png(), "Transcribe", "fake", stream=False)
+    assert result["markdown"].startswith("# Fake transcription")
+    assert "".join(daemon.transcribe(png(), "Transcribe", "fake:chunk_delay=0.001,chars=500")).startswith("# Fake transcription")
+
+
+def test_requests_go_through_the_daemon_only_with_the_same_key(daemon):
+    local = []
+    models = daemon_or_local(lambda api_key, name: local.append(api_key) or "local model", daemon)
+    model = models("key-a", "fake")
+    assert isinstance(model, DaemonModel)
+    assert "> Describe" in model.generate_content(["Describe", {"mime_type": "image/png", "data": png()}]).text
+    assert models("key-b", "fake") == "local model"
+    assert models("", "fake") == "local model"
+    assert local == ["key-b", ""]
+    assert "key-a" not in str(daemon.ping())
+
+
+def test_remote_errors_keep_their_class_name(daemon):
+    with pytest.raises(Exception) as error:
+        DaemonModel(daemon, "fake:fatal_rate=1").generate_content(["Describe", {"mime_type": "image/png", "data": png()}])
+    assert type(error.value).__name__ == "InvalidArgument"
+
+
+def test_answered_jobs_are_not_kept(server, daemon):
+    for _ in range(3): daemon.transcribe(png(), "Transcribe", "fake", stream=False)
+    "".join(daemon.transcribe(png(), "Transcribe", "fake:chunk_delay=0.001"))
+    assert server.service.job_queue.jobs == []
+    assert daemon.ping()["requests"] == 4
@@ -0,0 +1,66 @@
+from PIL import Image, ImageDraw
+
+from gemini_vision.delta import FULL, REGION, REUSE, DeltaTracker
+from gemini_vision.jobs import run_job
+from gemini_vision.pipeline import make_model
+
+CONTEXT = ("transcribe", "fake", "original")
+
+
+def screenshot(total, noise=None):
+    image = Image.new("RGB", (1440, 900), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((40, 40), "Quarterly report", fill="black")
+    draw.text((40, 120), f"Total: {total}", fill="black")
+    if noise: draw.point(noise, fill="black")
+    return image
+
+
+def test_identical_and_noisy_captures_reuse_the_result():
+    tracker = DeltaTracker()
+    tracker.remember(screenshot(1000), CONTEXT, "Total: 1000")
+    assert tracker.decide(screenshot(1000), CONTEXT).kind == REUSE
+    decision = tracker.decide(screenshot(1000, noise=(700, 500)), CONTEXT)
+    assert (decision.kind, decision.previous_markdown) == (REUSE, "Total: 1000")
+
+
+def test_a_changed_digit_is_sent_as_a_region():
+    tracker = DeltaTracker()
+    tracker.remember(screenshot(1000), CONTEXT, "Total: 1000")
+    for total in (1007, 7777, 77777):
+        decision = tracker.decide(screenshot(total), CONTEXT)
+        assert decision.kind == REGION
+        left, top, right, bottom = decision.box
+        assert left <= 60 and top <= 120 <= bottom and right < 400
+
+
+def test_regions_are_not_sent_when_not_allowed():
+    tracker = DeltaTracker()
+    tracker.remember(screenshot(1000), CONTEXT, "Total: 1000")
+    assert tracker.decide(screenshot(1007), CONTEXT, allow_region=False).kind == FULL
+
+
+def test_unrelated_captures_and_other_contexts_are_sent_in_full():
+    tracker = DeltaTracker()
+    tracker.remember(screenshot(1000), CONTEXT, "Total: 1000")
+    assert tracker.decide(Image.new("RGB", (800, 600), "white"), CONTEXT).kind == FULL
+    assert tracker.decide(screenshot(1000), ("other prompt", "fake", "original")).kind == FULL
+
+
+def test_reuse_keeps_the_transcribed_capture_as_baseline(make_capture, make_job):
+    calls = []
+    def models(api_key, name):
+        calls.append(name)
+        return make_model(api_key, name)
+    tracker = DeltaTracker()
+    run_job(make_job(make_capture()), delta=tracker, models=models)
+    noisy = make_job(make_capture(dots=[(600, 380)]))
+    run_job(noisy, delta=tracker, models=models)
+    assert noisy.delta == REUSE
+    # Compared with the previous capture, the two dots would span most of the screen.
+    other = make_job(make_capture(dots=[(5, 390)]))
+    run_job(other, delta=tracker, models=models)
+    assert other.delta == REUSE and len(calls) == 1
+    edited = make_job(make_capture("screenshot, edited"))
+    run_job(edited, delta=tracker, models=models)
+    assert edited.delta == REGION and len(calls) == 2
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from PIL import Image
+
+from gemini_vision.history import History, fts_query
+
+
+@pytest.fixture(params=["fts", "like"])
+def history(request, tmp_path):
+    history = History(str(tmp_path / "history.sqlite3"))
+    history.count() # Connects, detecting FTS5
+    if request.param == "fts" and not history.fts: pytest.skip("SQLite was built without FTS5")
+    if request.param == "like": history.fts = False
+    yield history
+    history.close()
+
+
+def test_fts_query_quotes_words_and_operators():
+    assert fts_query("alpha  beta") == '"alpha"* "beta"*'
+    assert fts_query('say "hi"') == '"say"* """hi"""*'
+    assert fts_query("a OR b NOT c*") == '"a"* "OR"* "b"* "NOT"* "c*"*'
+    assert fts_query("   ") == ""
+
+
+def test_add_page_and_count_without_a_query(history):
+    ids = [history.add(f"# Entry {i}", "Transcribe", "models/m", image=Image.new("RGB", (400, 300), "white")) for i in range(3)]
+    assert history.count() == 3
+    rows = history.page()
+    assert [row["id"] for row in rows] == ids[::-1] # Newest first
+    assert rows[0]["snippet"] == "# Entry 2"
+    assert rows[0]["thumbnail"].startswith(b"\xff\xd8") # JPEG
+    assert history.get(ids[0])["markdown"] == "# Entry 0"
+    assert history.get(12345) is None
+
+
+def test_page_with_a_query(history):
+    history.add("Invoice total 120 EUR", "Transcribe", "m")
+    history.add("Meeting notes", "Summarize the invoices", "m")
+    history.add("Unrelated", "Transcribe", "m")
+    assert history.count("invoice") == 2 # Prefix match, in the Markdown or the prompt
+    assert history.count("invoice total") == 1 # Every word must match
+    assert history.count("nothing") == 0
+    rows = history.page("TOTAL")
+    assert len(rows) == 1 and rows[0]["snippet"].startswith("Invoice total")
+
+
+def test_page_snippet_is_around_the_first_word(history):
+    history.add("x" * 500 + " needle " + "y" * 500, "Transcribe", "m")
+    snippet = history.page("needle")[0]["snippet"]
+    assert "needle" in snippet and len(snippet) < 500
+
+
+def test_pagination_is_newest_first_without_overlap(history):
+    ids = [history.add(f"page entry {i}", "Transcribe", "m") for i in range(7)]
+    for query in ("", "page"):
+        pages = [history.page(query, offset=offset, limit=3) for offset in (0, 3, 6)]
+        assert [row["id"] for page in pages for row in page] == ids[::-1]
+        assert [len(page) for page in pages] == [3, 3, 1]
+
+
+def test_queries_with_quotes_and_operators_do_not_fail(history):
+    history.add('He said "hello" AND left', "Transcribe", "m")
+    history.add("100% of a_b", "Transcribe", "m")
+    assert history.count('"hello"') == 1
+    assert history.count("AND") == 1
+    assert history.count("NEAR(") == 0
+    assert history.count("a_b") == 1 # LIKE wildcards are escaped
+    assert history.count("100%") == 1
+
+
+def test_deleted_entries_are_no_longer_found(history):
+    entry = history.add("Disposable note", "Transcribe", "m")
+    history.delete(entry)
+    assert history.count("disposable") == 0 and history.get(entry) is None
+
+
+def test_markdown_for_key(history):
+    assert history.markdown_for_key("k") is None
+    assert history.markdown_for_key(None) is None
+    history.add("# First", "Transcribe", "m", cache_key="k")
+    history.add("# Second", "Transcribe", "m", cache_key="k")
+    history.add("# Other", "Transcribe", "m", cache_key="other")
+    markdown, finished_at = history.markdown_for_key("k")
+    assert markdown == "# Second" and time.time() - 60 < finished_at <= time.time()
+    assert history.markdown_for_key("k", since=time.time() + 60) is None
+
+
+def test_entries_added_without_fts_are_indexed_once_it_is_available(tmp_path, monkeypatch):
+    path = str(tmp_path / "history.sqlite3")
+    monkeypatch.setattr("gemini_vision.history.FTS_SCHEMA", "CREATE VIRTUAL TABLE entries_fts USING missing_module(x);")
+    plain = History(path)
+    plain.add("Written before the index existed", "Transcribe", "m")
+    assert plain.fts is False
+    plain.close()
+    monkeypatch.undo()
+    indexed = History(path)
+    indexed.count()
+    if not indexed.fts: pytest.skip("SQLite was built without FTS5")
+    assert indexed.count("before index") == 1
+    indexed.close()
@@ -0,0 +1,56 @@
+import json
+
+from gemini_vision.instrumentation import TimingLog, Timings, format_ms, percentile
+
+
+def test_merged_adds_stages_and_keeps_the_originals():
+    capture, job = Timings(), Timings()
+    capture.add("decode", 0.010)
+    job.add("decode", 0.005)
+    job.add("generate_content", 1.5)
+    merged = capture.merged(job)
+    assert merged.milliseconds() == {"decode": 15.0, "generate_content": 1500.0}
+    assert capture.milliseconds() == {"decode": 10.0}
+
+
+def test_summary_follows_the_stage_order_then_unknown_stages():
+    timings = Timings()
+    timings.add("custom", 0.002)
+    timings.add("set_html", 0.003)
+    timings.add("screencapture", 0.25)
+    timings.add("first_token", 1.234)
+    assert timings.summary() == "capture 250ms · TTFT 1.23s · render 3ms · custom 2ms"
+    assert format_ms(999) == "999ms" and format_ms(1000) == "1.00s"
+
+
+def test_stage_records_time_even_when_it_raises():
+    timings = Timings()
+    try:
+        with timings.stage("decode"): raise ValueError
+    except ValueError: pass
+    assert "decode" in timings.stages
+
+
+def test_percentile_edges():
+    assert percentile([7], 0.5) == percentile([7], 0.95) == 7
+    values = list(range(1, 21))
+    assert percentile(values, 0.5) == 10
+    assert percentile(values, 0.95) == 19
+    assert percentile([3, 1, 2], 0.5) == 2 # Unsorted input
+    assert percentile([1, 2], 0) == 1 and percentile([1, 2], 1) == 2
+
+
+def test_timing_log_appends_one_json_line_per_record(tmp_path):
+    path = tmp_path / "logs" / "timings.jsonl"
+    log = TimingLog(str(path))
+    log.append({"stages_ms": {"decode": 1.0}})
+    log.append({"stages_ms": {"decode": 2.0}, "note": "ünïcode"})
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["stages_ms"]["decode"] for r in records] == [1.0, 2.0]
+    assert records[1]["note"] == "ünïcode" and all("logged_at" in r for r in records)
+
+
+def test_timing_log_ignores_write_errors(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    TimingLog(str(blocker / "timings.jsonl")).append({"stages_ms": {}}) # Its directory cannot be created
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from gemini_vision.delta import DeltaTracker
+from gemini_vision.jobs import CANCELLED, DONE, JobQueue
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_cancelling_a_job_a_worker_already_picked_up(make_capture, make_job):
+    updates = []
+    queue = JobQueue(1, on_update=lambda j: updates.append(j.status))
+    started = threading.Event()
+    release = threading.Event()
+    run = queue._run
+    def delayed_run(j):
+        started.set()
+        release.wait()
+        run(j)
+    queue._run = delayed_run
+    cancelled = queue.submit(make_job(make_capture()))
+    started.wait()
+    queue.cancel(cancelled) # Too late for future.cancel()
+    release.set()
+    wait_until(lambda: cancelled.finished)
+    assert cancelled.status == CANCELLED and updates[-1] == CANCELLED
+
+
+def test_released_captures_are_freed_when_their_jobs_finish(make_capture, make_job):
+    finished_images = []
+    def on_update(j):
+        if j.finished: finished_images.append(j.capture.image) # e.g. the history thumbnail
+    queue = JobQueue(3, on_update=on_update, delta=DeltaTracker())
+    shots, previous = [], None
+    for index in range(6):
+        shot = make_capture(f"screenshot {index}")
+        if previous: previous.release() # As the GUI does when a newer capture replaces it
+        queue.submit(make_job(shot, "fake:latency=0.05"))
+        shots.append(previous := shot)
+    wait_until(lambda: all(j.finished for j in queue.jobs))
+    assert all(j.status == DONE for j in queue.jobs)
+    assert [shot._image is None for shot in shots] == [True] * 5 + [False]
+    assert len(finished_images) == 6
+
+
+def test_finished_jobs_beyond_the_limit_are_dropped(make_capture, make_job):
+    queue = JobQueue(2, max_jobs=3)
+    for _ in range(3): queue.submit(make_job(make_capture()))
+    wait_until(lambda: all(j.finished for j in queue.jobs))
+    queue.submit(make_job(make_capture()))
+    queue.submit(make_job(make_capture()))
+    assert len(queue.jobs) == 3 and queue.dropped == 2
@@ -0,0 +1,39 @@
+import json
+import time
+
+from gemini_vision.models import ModelCatalogue, pick_hedge_model, sort_models
+
+
+def test_sort_models_prefers_latest_and_newer_versions():
+    names = ["models/gemini-1.5-flash", "models/gemini-2.0-flash", "models/gemini-1.5-flash-latest"]
+    assert sort_models(names) == ["models/gemini-1.5-flash-latest", "models/gemini-2.0-flash", "models/gemini-1.5-flash"]
+
+
+def test_pick_hedge_model_takes_a_faster_tier():
+    models = ["models/gemini-1.5-pro", "models/gemini-1.5-flash", "models/gemini-1.5-flash-8b"]
+    assert pick_hedge_model(models, "models/gemini-1.5-pro") == "models/gemini-1.5-flash"
+    assert pick_hedge_model(models, "models/gemini-1.5-flash-8b") is None
+
+
+def test_catalogue_round_trip_per_key(tmp_path):
+    catalogue = ModelCatalogue(str(tmp_path / "models.json"))
+    assert catalogue.load("key-a") is None
+    catalogue.save("key-a", ["models/a"])
+    catalogue.save("key-b", ["models/b"])
+    assert catalogue.load("key-a") == ["models/a"]
+    assert catalogue.load("key-b") == ["models/b"]
+    assert "key-a" not in (tmp_path / "models.json").read_text() # Only a hash of the key is stored
+
+
+def test_catalogue_ignores_old_and_unreadable_files(tmp_path):
+    path = tmp_path / "models.json"
+    catalogue = ModelCatalogue(str(path), max_age=60)
+    catalogue.save("key", ["models/a"])
+    data = json.loads(path.read_text())
+    data[ModelCatalogue.fingerprint("key")]["fetched_at"] = time.time() - 120
+    path.write_text(json.dumps(data))
+    assert catalogue.load("key") is None
+    path.write_text("not json")
+    assert catalogue.load("key") is None
+    catalogue.save("key", ["models/b"]) # A broken file is replaced
+    assert catalogue.load("key") == ["models/b"]
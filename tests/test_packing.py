@@ -0,0 +1,88 @@
+from gemini_vision.batch import JsonlSink, RateLimiter, process_pack, run_batch
+from gemini_vision.fake import FakeModel, InvalidArgument
+from gemini_vision.packing import PACK_MARKER, PackBudget, is_pack_size_error, plan_packs, split_response
+from gemini_vision.policy import RequestTimeout
+
+
+def packed(*sections):
+    return "".join(f"{PACK_MARKER.format(index=number)}\n{body}\n" for number, body in sections)
+
+
+def test_split_response():
+    assert split_response(packed((1, "# One"), (2, "# Two"), (3, "# Three")), 3) == {1: "# One\n", 2: "# Two\n", 3: "# Three\n"}
+
+
+def test_split_response_tolerates_markdown_around_delimiters():
+    text = "**<<<IMAGE 1>>>**\n# One\n### <<< image 2 >>>\n# Two\n"
+    assert split_response(text, 2) == {1: "# One\n", 2: "# Two\n"}
+
+
+def test_split_response_drops_the_section_before_a_missing_delimiter():
+    # Image 2's delimiter is missing, so section 1 may hold both answers.
+    assert split_response(packed((1, "# One"), (3, "# Three")), 3) == {3: "# Three\n"}
+    assert split_response(packed((2, "# Two")), 2) == {2: "# Two\n"}
+
+
+def test_split_response_rejects_out_of_order_or_unknown_numbers():
+    assert split_response(packed((2, "# Two"), (1, "# One")), 2) == {}
+    assert split_response(packed((1, "# One"), (1, "# Again")), 2) == {}
+    assert split_response(packed((1, "# One"), (5, "# Five")), 2) == {}
+    assert split_response("No delimiters at all", 2) == {}
+
+
+def test_split_response_leaves_out_empty_sections():
+    assert split_response(packed((1, ""), (2, "# Two")), 2) == {2: "# Two\n"}
+
+
+def test_plan_packs_respects_the_budget():
+    budget = PackBudget(max_images=3, max_bytes=100, max_input_tokens=1000)
+    assert plan_packs([(10, 100)] * 7, budget) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert plan_packs([(60, 100), (60, 100), (200, 100)], budget) == [[0], [1], [2]]
+    assert plan_packs([(10, 600), (10, 600)], budget) == [[0], [1]]
+    assert PackBudget(max_images=8, max_output_tokens=4000, output_tokens_per_image=1000).images_per_pack == 4
+
+
+def test_size_errors_are_told_apart_from_fatal_ones():
+    assert is_pack_size_error(InvalidArgument("400 Request payload size exceeds the limit: 20971520 bytes."))
+    assert not is_pack_size_error(InvalidArgument("400 API key not valid. Please pass a valid API key."))
+    assert not is_pack_size_error(RequestTimeout("No answer within 180s."))
+
+
+def test_packs_fall_back_to_single_images_for_missing_sections(make_images):
+    paths = make_images(4)
+    model = FakeModel(drop_delimiter=1.0)
+    results = process_pack(model, "fake", "Transcribe", paths, RateLimiter(), budget=PackBudget(max_images=4))
+    assert model.calls == 5 # One packed request, then one per image
+    assert all("packed" not in record and "- Image 1:" in record["markdown"] for record in results)
+
+
+def test_packed_batch(make_images, tmp_path):
+    paths = make_images(6)
+    model = FakeModel()
+    sink = JsonlSink(str(tmp_path / "out.jsonl"))
+    assert run_batch(paths, sink, model, "Transcribe", log=lambda msg: None, budget=PackBudget(max_images=3)) == (6, 0, 0)
+    sink.close()
+    assert model.calls == 2
+
+
+class Rejecting:
+    """Rejects packed requests with `error` and answers single ones."""
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def generate_content(self, contents, stream=False):
+        self.calls += 1
+        if len(contents) > 2: raise self.error
+        return FakeModel().generate_content(contents)
+
+
+def test_only_size_errors_fall_back_to_single_images(make_images):
+    paths = make_images(3)
+    too_large = Rejecting(InvalidArgument("400 Request payload size exceeds the limit"))
+    assert all(isinstance(r, dict) for r in process_pack(too_large, "fake", "p", paths, RateLimiter(), budget=PackBudget(max_images=3)))
+    assert too_large.calls == 4
+    for error in (InvalidArgument("400 API key not valid."), RequestTimeout("No answer within 180s.")):
+        model = Rejecting(error)
+        assert process_pack(model, "fake", "p", paths, RateLimiter(), budget=PackBudget(max_images=3)) == [error] * 3
+        assert model.calls == 1
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from gemini_vision.fake import FakeModel, FakeResponse, InvalidArgument, ServiceUnavailable
+from gemini_vision.policy import RequestPolicy, RequestTimeout, is_transient
+
+
+def fast_policy(**kwargs):
+    return RequestPolicy(**dict(dict(backoff=0.01, max_backoff=0.02), **kwargs))
+
+
+class SlowStream:
+    """Streams `chunks` lines, `delay` seconds apart, and records how many were produced."""
+    def __init__(self, delay, chunks=5):
+        self.delay = delay
+        self.chunks = chunks
+        self.produced = 0
+
+    def generate_content(self, contents, stream=False):
+        return self._stream()
+
+    def _stream(self):
+        for index in range(self.chunks):
+            time.sleep(self.delay)
+            self.produced += 1
+            yield FakeResponse(f"slow {index}\n", 0)
+
+
+def test_transient_errors_are_recognized_by_class_name():
+    assert is_transient(ServiceUnavailable())
+    assert is_transient(type("TooManyRequests", (Exception,), {})())
+    assert not is_transient(InvalidArgument())
+
+
+def test_transient_errors_are_retried():
+    fake = FakeModel(fail_first=2)
+    model = fast_policy(retries=3).wrap(fake, "fake")
+    assert model.generate_content(["prompt"]).text.startswith("# Fake transcription")
+    assert fake.calls == 3 and model.retries == 2
+    assert model.describe() == "2 retries"
+
+
+def test_retries_are_limited():
+    fake = FakeModel(fail_first=5)
+    model = fast_policy(retries=2).wrap(fake, "fake")
+    with pytest.raises(ServiceUnavailable): model.generate_content(["prompt"])
+    assert fake.calls == 3
+
+
+def test_fatal_errors_are_not_retried():
+    fake = FakeModel(fatal_rate=1.0)
+    model = fast_policy(retries=3).wrap(fake, "fake")
+    with pytest.raises(InvalidArgument): model.generate_content(["prompt"])
+    assert fake.calls == 1 and model.retries == 0
+
+
+def test_deadline():
+    model = fast_policy(deadline=0.2).wrap(FakeModel(latency=2.0), "fake")
+    started = time.monotonic()
+    with pytest.raises(RequestTimeout): model.generate_content(["prompt"])
+    assert time.monotonic() - started < 1.0
+
+
+def test_streamed_chunks_pass_through():
+    model = fast_policy().wrap(FakeModel(chars=300), "fake")
+    text = "".join(chunk.text for chunk in model.generate_content(["prompt"], stream=True))
+    assert text == FakeModel(chars=300)._respond(["prompt"]).text
+
+
+def test_hedge_wins_and_the_slow_attempt_is_abandoned():
+    slow = SlowStream(delay=0.3)
+    model = fast_policy(hedge_after=0.05).wrap(slow, "slow", FakeModel(), "fast")
+    text = "".join(chunk.text for chunk in model.generate_content(["prompt"], stream=True))
+    assert "> prompt" in text
+    assert model.hedges == 1 and model.hedge_wins == 1
+    time.sleep(0.8)
+    assert slow.produced == 1 # Stopped after its first chunk arrived too late
+
+
+def test_no_hedge_when_the_first_answer_is_fast():
+    hedge = FakeModel()
+    model = fast_policy(hedge_after=1.0).wrap(FakeModel(), "fake", hedge, "hedge")
+    model.generate_content(["prompt"])
+    assert model.hedges == 0 and hedge.calls == 0
+
+
+def test_hedge_delay_follows_recent_latencies():
+    policy = fast_policy(hedge_after=5.0, min_samples=3, hedge_percentile=0.5)
+    assert policy.hedge_delay("m") == 5.0
+    for seconds in (0.1, 0.2, 0.3): policy.record_latency("m", seconds)
+    assert policy.hedge_delay("m") == pytest.approx(0.2)
+
+
+class Cancelled(Exception):
+    pass
+
+
+def test_check_abandons_a_waiting_request():
+    cancelled = threading.Event()
+    def check():
+        if cancelled.is_set(): raise Cancelled()
+    model = fast_policy().wrap(FakeModel(latency=2.0), "fake", check=check)
+    threading.Timer(0.1, cancelled.set).start()
+    started = time.monotonic()
+    with pytest.raises(Cancelled): model.generate_content(["prompt"])
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,52 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from gemini_vision.capture import Capture
+from gemini_vision.preprocess import PRESETS, PreprocessOptions, main, optimize_image
+
+
+def screenshot():
+    image = Image.new("RGB", (1200, 800), "white")
+    ImageDraw.Draw(image).rectangle((100, 100, 600, 400), fill=(250, 250, 250)) # Barely off-white
+    return image
+
+
+def test_from_spec():
+    options = PreprocessOptions.from_spec("format=webp,quality=70,max_side=2048,grayscale=1,border_tolerance=3")
+    assert (options.format, options.quality, options.max_side, options.grayscale, options.border_tolerance) == ("WEBP", 70, 2048, True, 3)
+    assert PreprocessOptions.from_spec("balanced") is PRESETS["balanced"]
+    with pytest.raises(ValueError): PreprocessOptions.from_spec("format=tiff")
+
+
+def test_signature_distinguishes_settings_that_change_the_upload():
+    image = screenshot()
+    loose, strict = PreprocessOptions(border_tolerance=8), PreprocessOptions(border_tolerance=2)
+    assert optimize_image(image, loose).size != optimize_image(image, strict).size
+    assert loose.signature() != strict.signature()
+    # Without trimming the tolerance makes no difference.
+    assert PreprocessOptions(trim_borders=False, border_tolerance=8).signature() == PreprocessOptions(trim_borders=False, border_tolerance=2).signature()
+    assert PRESETS["original"].signature() == "original"
+
+
+def test_original_uploads_the_captured_bytes():
+    buffer = io.BytesIO()
+    screenshot().save(buffer, format="PNG")
+    part, optimized = Capture(buffer.getvalue()).upload_part(PRESETS["original"])
+    assert part == {"mime_type": "image/png", "data": buffer.getvalue()} and optimized is None
+
+
+def test_optimize_image_limits_size_and_trims_borders():
+    optimized = optimize_image(Image.new("RGB", (6000, 1000), "white"), PreprocessOptions(trim_borders=False))
+    assert max(optimized.size) == 3072 and optimized.mime_type == "image/jpeg"
+    assert optimize_image(screenshot(), PreprocessOptions(border_tolerance=2)).size == (501, 301)
+
+
+def test_benchmark_reports_original_settings_unchanged(tmp_path, capsys):
+    path = tmp_path / "shot.png"
+    screenshot().save(path)
+    assert main([str(path), "-s", "original", "-s", "small"]) == 0
+    rows = capsys.readouterr().out.splitlines()[1:]
+    assert rows[0].split()[1:4] == ["original", "1200x800", str(path.stat().st_size)]
+    assert rows[0].split()[4] == "0%" and "webp" in rows[1]
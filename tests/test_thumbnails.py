@@ -0,0 +1,47 @@
+from PIL import Image
+
+from gemini_vision.capture import Capture
+from gemini_vision.thumbnails import WIDTH_STEP, ThumbnailCache, make_thumbnail
+
+
+def test_make_thumbnail_reduces_without_modifying_the_source():
+    source = Image.new("RGB", (4000, 3000), "white")
+    thumbnail = make_thumbnail(source, (300, 200))
+    assert thumbnail.width <= 300 and thumbnail.height <= 200
+    assert source.size == (4000, 3000)
+    small = Image.new("RGB", (100, 80), "white")
+    assert make_thumbnail(small, (300, 200)) is not small
+
+
+def test_make_thumbnail_converts_palette_and_bilevel_images():
+    for mode in ("P", "1"):
+        thumbnail = make_thumbnail(Image.new(mode, (800, 600)), (200, 150))
+        assert thumbnail.mode == "RGBA" and thumbnail.size == (200, 150)
+
+
+def test_size_for_rounds_down_to_the_width_step():
+    assert ThumbnailCache.size_for(649) == (600, 450)
+    assert ThumbnailCache.size_for(650, 300) == (650, 300)
+    assert ThumbnailCache.size_for(1) == ThumbnailCache.size_for(0) == (550, 450)
+    assert ThumbnailCache.size_for(20) == (WIDTH_STEP, 450)
+
+
+def test_a_second_get_is_a_hit_without_decoding(make_capture):
+    cache = ThumbnailCache()
+    shot = make_capture()
+    first = cache.get(shot, (200, 150))
+    same_bytes = Capture(shot.data)
+    assert cache.get(same_bytes, (200, 150)) is first
+    assert same_bytes._image is None # Never decoded
+    assert cache.get(shot, (100, 75)) is not first
+
+
+def test_the_least_recently_used_thumbnail_is_dropped(make_capture):
+    cache = ThumbnailCache(max_entries=2)
+    shots = [make_capture(f"screenshot {index}") for index in range(3)]
+    thumbnails = [cache.get(shot, (200, 150)) for shot in shots[:2]]
+    cache.get(shots[0], (200, 150)) # Now the most recently used
+    cache.get(shots[2], (200, 150))
+    assert list(cache._entries) == [(shots[0].data_digest, (200, 150)), (shots[2].data_digest, (200, 150))]
+    assert cache.get(shots[0], (200, 150)) is thumbnails[0]
+    assert cache.get(shots[1], (200, 150)) is not thumbnails[1]
@@ -0,0 +1,53 @@
+from PIL import Image
+
+from gemini_vision.fake import FakeModel
+from gemini_vision.preprocess import PRESETS
+from gemini_vision.tiling import plan_tiles, should_tile, stitch, transcribe_tiled
+
+
+def test_stitch_removes_lines_repeated_at_the_boundary():
+    parts = ["# Title\n\nLine 1\nLine 2\nLine 3\n", "Line 2\nLine 3\nLine 4\n", "Line 3\nLine 4\nLine 5\n"]
+    assert stitch(parts) == "# Title\n\nLine 1\nLine 2\nLine 3\nLine 4\nLine 5\n"
+
+
+def test_stitch_ignores_case_and_spacing_differences_in_the_overlap():
+    assert stitch(["Alpha\nBeta  gamma\n", "alpha\nbeta gamma\nDelta\n"]) == "Alpha\nBeta  gamma\nDelta\n"
+
+
+def test_stitch_drops_leading_lines_seen_just_before():
+    # The overlap was transcribed slightly differently, so no exact run matches.
+    parts = ["Zero\nOne\nTwo\nThree\n", "One\nTwo\nThree!\nFour\n"]
+    assert stitch(parts) == "Zero\nOne\nTwo\nThree\nThree!\nFour\n"
+
+
+def test_stitch_needs_more_than_one_short_line_of_overlap():
+    assert stitch(["Total\nYes\n", "Yes\nNo\n"]) == "Total\nYes\n\nYes\nNo\n"
+    long_line = "A single line long enough to be distinctive"
+    assert stitch([f"Start\n{long_line}\n", f"{long_line}\nEnd\n"]) == f"Start\n{long_line}\nEnd\n"
+
+
+def test_stitch_keeps_a_code_fence_that_starts_a_strip():
+    parts = ["Intro\n\n```\nx = 1\n```\n", "```\ny = 2\n```\n"]
+    assert stitch(parts) == "Intro\n\n```\nx = 1\n```\n\n```\ny = 2\n```\n"
+    assert stitch(["Text\n\n---\n", "---\nMore\n"]) == "Text\n\n---\n\n---\nMore\n"
+
+
+def test_stitch_keeps_parts_without_overlap_apart():
+    assert stitch(["First part\n", "Second part\n"]) == "First part\n\nSecond part\n"
+
+
+def test_plan_tiles_covers_the_image_with_overlap():
+    boxes = plan_tiles((1000, 5000))
+    assert len(boxes) > 1 and boxes[0][1] == 0 and boxes[-1][3] == 5000
+    assert all(b[1] < a[3] for a, b in zip(boxes, boxes[1:]))
+    assert plan_tiles((1000, 1200)) == [(0, 0, 1000, 1200)]
+    assert should_tile((1000, 5000)) and not should_tile((1000, 1200))
+
+
+def test_transcribe_tiled_reports_progress_in_order():
+    image = Image.new("RGB", (400, 2000), "white")
+    progress = []
+    markdown = transcribe_tiled(image, "Transcribe", FakeModel(), PRESETS["original"], on_tile=lambda done, count, partial: progress.append((done, count)))
+    count = len(plan_tiles(image.size))
+    assert progress == [(done, count) for done in range(1, count + 1)]
+    assert markdown.startswith("# Fake transcription")